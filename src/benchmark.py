@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import retro
+
+from bot import Bot
+from controls import Controls
+from perception import BatchPerception
+from profiler import Profiler, PERCENTILES
+from recording import InputRecorder, logged_frames, read_log, replay as replay_log
+
+# Stages timed by Bot.refresh, in pipeline order
+STAGES = [
+    "perception",
+    "detect_player",
+    "detect_objects",
+    "detect_passings",
+    "track",
+    "kalman",
+    "action",
+    "busy",
+]
+BASELINE_PASSES = 3  # Fewest timed passes a baseline is stored from, one pass is too noisy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="River Raid Bot perception and decision benchmark")
+    parser.add_argument(
+        "--rom", type=str, default="river-raid.a26",
+        help="Path to the game ROM file, used to record and replay the corpus (default: river-raid.a26)"
+    )
+    parser.add_argument(
+        "--corpus", type=str, default="benchmarks/corpus.log",
+        help="Input log whose frames are replayed, recorded first if missing"
+    )
+    parser.add_argument(
+        "--record", type=int, default=3000,
+        help="Number of frames to record when creating the corpus"
+    )
+    parser.add_argument(
+        "--skip", type=int, default=300,
+        help="Logged frames left out of the corpus (the game starts at frame 180)"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Timed passes over the corpus, after one warm-up pass"
+    )
+    parser.add_argument(
+        "--baseline", type=str, default="benchmarks/baseline.json",
+        help="Stored results to compare against"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="Store these results as the new baseline instead of comparing"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="Relative slowdown of the busy p50, best of the passes, that counts as a regression"
+    )
+    parser.add_argument(
+        "--batch", type=int,
+        help="Replay the corpus as this many games and compare batched with separate perception"
+    )
+    args = parser.parse_args()
+    if args.save_baseline and args.repeat < BASELINE_PASSES:
+        parser.error(f"a baseline needs --repeat {BASELINE_PASSES} or more, one pass is too noisy")
+    return args
+
+
+def record_corpus(rom, path, frames):
+    # Play from power-on with the bot and keep its buttons. The log is committed, so every
+    # checkout replays the same frames whatever the bot decides today.
+    game = retro.RetroEmulator(rom)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    recorder = InputRecorder(path, game.get_state())
+    controls = Controls()
+    bot = Bot(controls)
+    for _ in range(frames):
+        bot.refresh(game.get_screen())
+        controls.update_inputs()
+        recorder.record(controls.buttons)
+        game.set_button_mask(controls.buttons)
+        game.step()
+        controls.tick()
+    recorder.close()
+    print(f"Recorded {frames} frames to {path}")
+
+
+def load_corpus(rom, path, skip):
+    # Screens of the logged game, replayed without the bot
+    state, masks = read_log(path)
+    game = retro.RetroEmulator(rom)
+    screens = np.zeros((logged_frames(masks), *game.get_screen().shape), np.uint8)
+    replay_log(game, state, masks, screens)
+    return screens[skip:]
+
+
+def replay(screens, profiler=None):
+    # Run the whole bot pipeline over the corpus, as if it were playing
+    controls = Controls()
+    bot = Bot(controls, auto_start=True, profiler=profiler)
+    for screen in screens:
+        bot.refresh(screen)
+        controls.update_inputs()
+        controls.tick()
+        if profiler is not None:
+            profiler.end_frame()
+
+
+def run_benchmark(screens, repeat):
+    replay(screens)  # Warm-up: caches, lazy imports, first allocations
+    profiler = Profiler()
+    for _ in range(repeat):
+        replay(screens, profiler)
+
+    # Microseconds per call and calls per second of every stage
+    stages = profiler.summary()["stages"]
+    results = {}
+    for stage in STAGES:
+        stats = {key: value * 1000 for key, value in stages[stage].items()}
+        stats["throughput"] = 1e6 / stats["mean"] if stats["mean"] > 0 else float("inf")
+        results[stage] = stats
+
+    # The regression gate: the median busy time of the fastest pass. A single stage's
+    # median is tens of microseconds and the slowest passes are the ones other load hit.
+    busy = profiler.durations()["busy"].reshape(repeat, len(screens)) * 1000
+    best_busy = float(np.percentile(busy, 50, axis=1).min())
+    return {"frames": len(screens) * repeat, "stages": results, "best_busy_p50": best_busy}
+
+
+def replay_games(streams, batch=None):
+    # Every game plays its own stretch of the corpus; with a batch, all of a step's screens
+    # are perceived at once and the bots only detect, track and decide
+    bots = []
+    for game in range(streams.shape[1]):
+        perception = batch.perceptions[game] if batch is not None else None
+        controls = Controls()
+        bots.append((Bot(controls, auto_start=True, perception=perception), controls))
+
+    start = time.perf_counter()
+    for screens in streams:
+        if batch is not None:
+            batch.update(screens)
+        for (bot, controls), screen in zip(bots, screens):
+            bot.refresh(None if batch is not None else screen)
+            controls.update_inputs()
+            controls.tick()
+    return streams.shape[0] * streams.shape[1] / (time.perf_counter() - start)
+
+
+def run_batch(screens, games, repeat):
+    # Frames per second over all games, best of the passes
+    steps = len(screens) // games
+    streams = screens[: steps * games].reshape(games, steps, *screens.shape[1:]).swapaxes(0, 1)
+    batch = BatchPerception(games)
+    separate = max(replay_games(streams) for _ in range(repeat + 1))
+    batched = max(replay_games(streams, batch) for _ in range(repeat + 1))
+    return separate, batched
+
+
+def compare(results, baseline, tolerance):
+    # Print every stage next to its baseline, return whether the busy time got slower. Stages
+    # are only reported, their medians are too short to gate on.
+    print(f"{'Stage':<16}{'mean':>9}{'p50':>9}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES[1:])
+          + f"{'calls/s':>11}{'base p50':>10}{'change':>9}")
+    for stage, stats in results["stages"].items():
+        line = f"{stage:<16}{stats['mean']:>9.1f}{stats['p50']:>9.1f}"
+        line += "".join(f"{stats[f'p{p}']:>9.1f}" for p in PERCENTILES[1:])
+        line += f"{stats['throughput']:>11.0f}"
+
+        base = baseline["stages"].get(stage) if baseline else None
+        if base is not None and base["p50"] > 0:
+            change = stats["p50"] / base["p50"] - 1
+            line += f"{base['p50']:>10.1f}{change:>+9.0%}"
+        print(line)
+
+    best = results["best_busy_p50"]
+    line = f"Busy p50 of the fastest pass {best:.1f}"
+    if not baseline:
+        print(line)
+        return False
+    base = baseline.get("best_busy_p50", baseline["stages"]["busy"]["p50"])
+    change = best / base - 1
+    print(f"{line}, baseline {base:.1f} ({change:+.0%})")
+    return change > tolerance
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(args.corpus):
+        record_corpus(args.rom, args.corpus, args.skip + args.record)
+    screens = load_corpus(args.rom, args.corpus, args.skip)
+
+    if args.batch is not None:
+        separate, batched = run_batch(screens, args.batch, args.repeat)
+        print(f"{args.batch} games over {len(screens)} frames (frames per second, all games)")
+        print(f"  separate perception {separate:9.0f}")
+        print(f"  batched perception  {batched:9.0f}  {batched / separate - 1:+.0%}")
+        return
+
+    results = run_benchmark(screens, args.repeat)
+    print(f"Benchmark over {results['frames']} frames (microseconds per frame)")
+
+    if args.save_baseline:
+        compare(results, None, args.tolerance)
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to store one")
+
+    if compare(results, baseline, args.tolerance):
+        print(f"Regression: the busy time got more than {args.tolerance:.0%} slower")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
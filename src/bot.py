@@ -1,43 +1,157 @@
 from math import nan
-import cv2
-import time
-import numpy as np
+from time import perf_counter
 
+from config import DEFAULT_CONFIG
 from controls import Command
-from elements import Bridge, Player, Helicopter, Boat, Plane, Fuel, Passing
+from elements import Bridge, Player, Helicopter, Boat, Plane, Fuel
+from perception import (
+    Perception,
+    PLAYER,
+    HELICOPTER,
+    PLANE,
+    BOAT,
+    FUEL,
+    BRIDGE,
+    ROI_WIDTH,
+    ROI_HEIGHT,
+    to_display,
+    to_display_box,
+    to_native,
+)
+from kalman import KalmanBank
+from profiler import NullProfiler
+from ram import FUEL_FULL
+from river import RiverMap
+from tracker import Tracker
+
+
+START_DELAY = 180  # Frames to wait before pressing start (3 seconds at 60 FPS)
+PLAYER_Y = 448  # Display row of the player center, the plane never moves vertically
+PLAYER_TOP = 408  # Display row above which the player sprite never reaches
+PASSING_Y = 270  # Display row the passings are looked for in
+NARROW_PASSING = 120  # Display width below which a passing needs a decision every frame
+
+OBJECT_CLASSES = {
+    HELICOPTER: Helicopter,
+    PLANE: Plane,
+    BOAT: Boat,
+    FUEL: Fuel,
+    BRIDGE: Bridge,
+}
 
 
 class Bot:
-    def __init__(self, controls, auto_start=False):
+    def __init__(
+        self,
+        controls,
+        auto_start=False,
+        ram=None,
+        profiler=None,
+        frame_skip=1,
+        config=DEFAULT_CONFIG,
+        game_ram=None,
+        perception=None,
+    ):
         self.controls = controls
+        self.config = config
+        self.areas = {
+            HELICOPTER: config.helicopter_area,
+            PLANE: config.plane_area,
+            BOAT: config.boat_area,
+            FUEL: config.fuel_area,
+            BRIDGE: config.bridge_area,
+        }
+        self.ram = ram  # Read entities from the game RAM instead of the screen when set
+        self.game_ram = game_ram  # Launches the planes after a lost life, whatever the perception
+        self.lives = None  # Lives of the plane launched last
+        self.profiler = profiler if profiler is not None else NullProfiler()
+        # One of a BatchPerception's when the screens of many games are perceived together
+        self.perception = perception if perception is not None else Perception(config)
+        self.river = RiverMap()
+        self.tracker = Tracker()
+        self.planes = KalmanBank()
         self.player = Player()
         self.will_move = False
         self.enemies = []
         self.fuels = []
         self.passings = []
+        self.targets = {}  # Elements the last decision reacted to, by reason
         self.started = auto_start
-        self.start_time = time.time()
-
-    def refresh(self, frame):
-        # Define Region Of Interest
-        height, width = frame.shape[:2]
-        y_start, y_end = 0, 480
-        x_start, x_end = 0, width
-        roi = frame[y_start:y_end, x_start:x_end]
-
-        # Detect all entities in roi
-        self.detect_player(roi)
-        enemies, self.fuels = self.detect_objects(roi)
-        self.enemies = self.keep_same(self.enemies, enemies)
-        self.detect_passings(roi)
-        cv2.imshow("Detected Objects", roi)
+        self.frame_count = 0
+        # Decide at most every frame_skip frames and hold the buttons in between, sooner
+        # when something is about to go wrong (see decision_interval)
+        self.frame_skip = frame_skip
+        self.last_decision = 0
+        self.next_decision = 0
+
+    def refresh(self, screen):
+        self.frame_count += 1
+        if self.frame_count < self.next_decision:
+            return  # The buttons of the last decision are still held
+        frames = self.frame_count - self.last_decision
+        self.last_decision = self.frame_count
+        start = self.perceive(screen, frames)
 
         # Act based on entities
         self.action()
-
-        # Clear entities
-        self.fuels = []
-        self.passings = []
+        interval = self.decision_interval()
+        self.controls.hold(interval)
+        self.next_decision = self.frame_count + interval
+        self.profiler.lap("action", start)
+
+    def perceive(self, screen, frames=1):
+        # Detect all entities, perception runs on the raw screen. frames is the number of
+        # emulator frames since the last call. Returns the time the detection finished at.
+        # Without a screen, the perception was updated already (see BatchPerception).
+        profiler = self.profiler
+        start = perf_counter()
+        if self.ram is not None:
+            self.read_player()
+            start = profiler.lap("detect_player", start)
+            enemies, self.fuels = self.read_objects()
+            start = profiler.lap("detect_objects", start)
+        else:
+            if screen is not None:
+                self.perception.update(screen)
+            start = profiler.lap("perception", start)
+            self.detect_player()
+            start = profiler.lap("detect_player", start)
+            enemies, self.fuels = self.detect_objects()
+            start = profiler.lap("detect_objects", start)
+            self.detect_passings(frames)
+            start = profiler.lap("detect_passings", start)
+        self.enemies = self.tracker.update(enemies, frames)
+        start = profiler.lap("track", start)
+        self.planes.update(
+            [track for track in self.tracker.tracks if track.name == "Plane"], frames
+        )
+        return profiler.lap("kalman", start)
+
+    def decision_interval(self):
+        # Frames until the next decision: every frame near threats, frame_skip on open river
+        if self.frame_skip == 1 or not self.started:
+            return 1
+        targets = self.targets
+        if targets.get("Enemy Will Crash") or targets.get("Plane Will Crash"):
+            return 1
+        if any(passing.width < NARROW_PASSING for passing in self.passings):
+            return 1
+        if targets.get("Aiming Enemy") or targets.get("Almost Aiming Enemy"):
+            return max(1, self.frame_skip // 2)
+        return self.frame_skip
+
+    def snapshot(self):
+        # Plain copies of what the bot perceived and decided, safe to draw from another thread
+        player = self.player
+        return {
+            "player": (*player.position, player.left, player.right) if player.present else None,
+            "objects": [
+                (element.name, *element.position, element.left, element.right)
+                for element in self.enemies + self.fuels
+            ],
+            "passings": [(passing.left, passing.right) for passing in self.passings],
+            "targets": {reason: str(element) for reason, element in self.targets.items()},
+        }
 
     def fire(self):
         if self.controls.manual:
@@ -69,15 +183,33 @@ class Bot:
             self.controls.input_commands([Command.LEFT])
             self.will_move = True
 
-    def action(self):
-        self.will_move = False
-
-        # Start game
-        if not self.started and time.time() - self.start_time >= 3:
+    def start_game(self):
+        # Press start once the title screen is up, return whether the game is running
+        if not self.started and self.frame_count >= START_DELAY:
             self.controls.input_commands([Command.START])
             self.started = True
-        elif not self.started:
+        elif self.started and self.game_ram is not None:
+            self.launch_plane()
+        return self.started
+
+    def launch_plane(self):
+        # After a lost life the next plane waits until any button is pressed. It is ready
+        # once the lives counter dropped, with a full tank and the explosion over.
+        ram = self.game_ram
+        lives = ram.lives
+        if lives is None or self.controls.manual:
             return
+        if self.lives is None or lives > self.lives:
+            self.lives = lives  # A new game
+        elif lives < self.lives and ram.fuel == FUEL_FULL and not ram.crashed:
+            self.controls.input_commands([Command.UP])
+            self.lives = lives
+
+    def action(self):
+        self.will_move = False
+        if not self.start_game():
+            return
+        config = self.config
 
         aiming_enemy = None
         almost_aiming_enemy = None
@@ -91,9 +223,10 @@ class Bot:
         self.enemies.sort(key=lambda e: e.position[1], reverse=True)
         self.passings.sort(key=lambda p: abs(self.player.x_diff(p)))
 
-        # Handle fuels considering player position
+        # Handle fuels considering player position. Checks run one element at a time, the river
+        # holds at most six objects and numpy calls on so few cost more than the comparisons.
         near_fuels = [
-            fuel for fuel in self.fuels if self.player.is_aligned(fuel, margin=35)
+            fuel for fuel in self.fuels if self.player.is_aligned(fuel, margin=config.fuel_margin)
         ]
         next_fuel = next(iter(near_fuels), None)
 
@@ -102,11 +235,13 @@ class Bot:
             if (
                 enemy.name == "Plane"
                 and enemy.predicted_x_at_y0 is not nan
-                and abs(self.player.position[0] - enemy.predicted_x_at_y0) < 70
+                and abs(self.player.position[0] - enemy.predicted_x_at_y0)
+                < config.plane_crash_distance
             ):
                 plane_will_crash = enemy
-            if self.player.is_aiming(enemy, tolerance=5) or (
-                enemy.name == "Bridge" and self.player.is_aligned(enemy, margin=50)
+            if self.player.is_aiming(enemy, tolerance=config.aim_tolerance) or (
+                enemy.name == "Bridge"
+                and self.player.is_aligned(enemy, margin=config.bridge_margin)
             ):
                 if not any(
                     self.player.is_aligned(fuel)
@@ -115,17 +250,17 @@ class Bot:
                 ):
                     aiming_enemy = aiming_enemy if aiming_enemy is not None else enemy
             elif (
-                self.player.is_aligned(enemy, margin=5)
-                and self.player.y_diff(enemy) > 75
+                self.player.is_aligned(enemy, margin=config.almost_aim_margin)
+                and self.player.y_diff(enemy) > config.almost_aim_distance
             ):
                 almost_aiming_enemy = almost_aiming_enemy if almost_aiming_enemy is not None else enemy
             elif (
-                self.player.y_diff(enemy) < 75
-                and self.player.is_aligned(enemy, margin=25)
+                self.player.y_diff(enemy) < config.crash_distance
+                and self.player.is_aligned(enemy, margin=config.crash_margin)
             ) or (
                 enemy.is_moving
-                and self.player.y_diff(enemy) < 75
-                and self.player.is_aligned(enemy, margin=75)
+                and self.player.y_diff(enemy) < config.crash_distance
+                and self.player.is_aligned(enemy, margin=config.moving_crash_margin)
             ):
                 enemy_will_crash = enemy_will_crash if enemy_will_crash is not None else enemy
 
@@ -133,12 +268,12 @@ class Bot:
             if p.includes(self.player):
                 if (
                     (
-                        abs(self.player.x_diff(p)) > 50
+                        abs(self.player.x_diff(p)) > config.center_margin_fuel
                         and len(near_fuels)
                         > 0  # there are fuels avaliable, but player is far from passing center
                     )
                     or (
-                        abs(self.player.x_diff(p)) > 15
+                        abs(self.player.x_diff(p)) > config.center_margin
                         and len(near_fuels)
                         == 0  # there are no fuels avaliable, player can be closer to passing center
                     )
@@ -150,7 +285,10 @@ class Bot:
             break
 
         if enemy_will_crash:
-            if should_center_passing is None or (should_center_passing.is_aligned(enemy_will_crash) and should_center_passing.width > enemy_will_crash.width * 2):
+            if should_center_passing is None or (
+                should_center_passing.is_aligned(enemy_will_crash)
+                and should_center_passing.width > enemy_will_crash.width * config.dodge_width_ratio
+            ):
                 self.move_to_element(enemy_will_crash, avoid=True)
                 self.controls.input_commands([Command.UP])
         if should_center_passing:
@@ -170,205 +308,106 @@ class Bot:
             else:
                 self.controls.input_commands([Command.UP])
 
-        print(f"""
-        Aiming Enemy:           {aiming_enemy}
-        Almost Aiming Enemy:    {almost_aiming_enemy}
-        Enemy Will Crash:       {enemy_will_crash}
-        Should Center Passing:  {should_center_passing}
-        Next Fuel:              {next_fuel}
-        Plane Will Crash:       {plane_will_crash}
-        """)
-
-    def detect_objects(self, frame):
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        self.targets = {
+            "Aiming Enemy": aiming_enemy,
+            "Almost Aiming Enemy": almost_aiming_enemy,
+            "Enemy Will Crash": enemy_will_crash,
+            "Should Center Passing": should_center_passing,
+            "Next Fuel": next_fuel,
+            "Plane Will Crash": plane_will_crash,
+        }
 
+    def detect_objects(self):
         enemies = []
         fuels = []
 
-        # Define objects to be identified
-        object_classes = [Helicopter, Plane, Boat, Fuel, Bridge]
-        objects = [cls([0, 0]) for cls in object_classes]
+        # Detect all blobs labeled with an object class
+        for label, x, y, w, h, area in self.perception.entities():
+            cls = OBJECT_CLASSES.get(label)
+            if cls is None:
+                continue
+            area_min, area_max = self.areas[label]
 
-        for object in objects:  # Detect all shapes that match the color mask
-            lower, upper = object.color
-            mask = cv2.inRange(hsv, np.array(lower), np.array(upper))
-            contours, _ = cv2.findContours(
-                mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
+            if (
+                area_min <= area <= area_max
+            ):  # Validate shape using area (native pixels) and create instance
+                x, y, w, h = to_display_box(x, y, w, h)
+                position = [x + w // 2, y + h // 2]
+                if cls is Fuel:
+                    fuels.append(Fuel(position))
+                else:
+                    enemies.append(cls(position))
 
-            for cnt in contours:
-                area = cv2.contourArea(cnt)
-                area_min, area_max = object.area
+        return enemies, fuels
 
-                if (
-                    area > 30 and area_min <= area <= area_max
-                ):  # Validate shape using area and create instance
-                    cv2.drawContours(
-                        frame, [cnt], -1, (255, 255, 255), 1
-                    )  # Draw object rectangle
-                    x, y, w, h = cv2.boundingRect(cnt)
-                    position = [x + w // 2, y + h // 2]
-                    if isinstance(object, Helicopter):
-                        enemies.append(Helicopter(position))
-                    elif isinstance(object, Fuel):
-                        fuels.append(Fuel(position))
-                    elif isinstance(object, Boat):
-                        enemies.append(Boat(position))
-                    elif isinstance(object, Plane):
-                        enemies.append(Plane(position))
-                    elif isinstance(object, Bridge):
-                        enemies.append(Bridge(position))
-
-        # Draw object identification
-        all_objects = (x for lst in (enemies, fuels) for x in lst)
-        for object in all_objects:
-            x, y = object.position
-            cv2.putText(
-                frame,
-                f"{object.name}",
-                (x, y - 4),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.4,
-                (255, 255, 255),
-                1,
-            )
-            cv2.circle(frame, position, radius=2, color=(0, 255, 0), thickness=-1)
-            cv2.line(
-                frame,
-                [object.left, y],
-                [object.right, y],
-                color=(255, 0, 255),
-                thickness=2,
-            )
+    def read_objects(self):
+        enemies = []
+        fuels = []
 
-        return enemies, fuels
+        # Every occupied RAM slot holds one object, no shape validation needed
+        for label, x, y in self.ram.objects():
+            position = [to_display(x), to_display(y)]
+            if label == FUEL:
+                fuels.append(Fuel(position))
+            else:
+                enemies.append(OBJECT_CLASSES[label](position))
 
-    def detect_player(self, frame):
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        return enemies, fuels
 
-        lower, upper = self.player.color
-        mask = cv2.inRange(hsv, lower, upper)
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    def read_player(self):
+        # The RAM holds no river geometry, so movement is never blocked and there are no passings
+        self.player.position = [to_display(self.ram.player_x), PLAYER_Y]
+        self.player.present = not self.ram.game_over
+        self.player.can_move_left = True
+        self.player.can_move_right = True
 
+    def detect_player(self):
         best_match = None
         best_area_diff = float("inf")
 
-        for cnt in contours:
-            x, y, w, h = cv2.boundingRect(cnt)
-            area = cv2.contourArea(cnt)
-            area_min, area_max = self.player.area
-            w_min = self.player.width - 5
-            w_max = self.player.width + 5
+        for _, x, y, w, h, area in self.perception.entities(PLAYER, to_native(PLAYER_TOP)):
+            x, y, w, h = to_display_box(x, y, w, h)
+            area_min, area_max = self.config.player_area
+            w_min = self.player.width - self.config.player_width_tolerance
+            w_max = self.player.width + self.config.player_width_tolerance
 
             if area_min <= area <= area_max and w_min <= w <= w_max:
                 area_diff = abs(area - ((area_max - area_min) / 2))
                 if area_diff < best_area_diff:
-                    best_match = (cnt, x + w // 2, y + h // 2)
+                    best_match = (x + w // 2, y + h // 2)
                     best_area_diff = area_diff
 
         if best_match:
-            cnt, center_x, center_y = best_match
+            center_x, center_y = best_match
             self.player.position = [center_x, center_y]
             self.player.present = True
 
-            x, y = self.player.position
-            cv2.circle(frame, [x, y], radius=1, color=(0, 255, 0), thickness=1)
-            cv2.line(
-                frame,
-                [self.player.left, y],
-                [self.player.right, y],
-                color=(255, 0, 255),
-                thickness=2,
-            )
-
             # Define movement limits
-            lower_blue = np.array([100, 100, 100])
-            upper_blue = np.array([140, 255, 255])
-            blue_mask = cv2.inRange(hsv, lower_blue, upper_blue)
-
             # Check left/right based on green presence
             x, y = self.player.position
-            offset = self.player.width // 2 + 18
-            second_offset = 30
+            offset = self.player.width // 2 + self.config.probe_offset
+            second_offset = self.config.probe_height
 
-            frame_height, frame_width = frame.shape[:2]
-            left_x = max(0, x - offset)
-            right_x = min(frame_width - 1, x + offset)
-            y = min(max(0, y), frame_height - 1) - 18
+            left_x = to_native(max(0, x - offset))
+            right_x = to_native(min(ROI_WIDTH - 1, x + offset))
+            y = min(max(0, y), ROI_HEIGHT - 1) - self.config.probe_rise
+            top_y = to_native(y)
+            bottom_y = to_native(y + second_offset)
 
-            # If pixel is blue, movement is allowed
+            # If pixel is blue, movement is allowed. Only the four probed pixels are read.
+            probe = self.perception.probe
             self.player.can_move_left = (
-                blue_mask[y, left_x] > 0 and blue_mask[y + second_offset, left_x] > 0
+                probe("River", top_y, left_x) and probe("River", bottom_y, left_x)
             )
             self.player.can_move_right = (
-                blue_mask[y, right_x] > 0 and blue_mask[y + second_offset, right_x] > 0
+                probe("River", top_y, right_x) and probe("River", bottom_y, right_x)
             )
-
-            # Draw indicators
-            # if self.player.can_move_left:
-            #     cv2.circle(frame, (left_x, y), 3, (255, 255, 0), -1)
-            #     cv2.circle(frame, (left_x, y + second_offset), 3, (255, 255, 0), -1)
-            # else:
-            #     cv2.circle(frame, (left_x, y), 3, (0, 0, 255), -1)
-            #     cv2.circle(frame, (left_x, y + second_offset), 3, (0, 0, 255), -1)
-            # if self.player.can_move_right:
-            #     cv2.circle(frame, (right_x, y), 3, (255, 255, 0), -1)
-            #     cv2.circle(frame, (right_x, y + second_offset), 3, (255, 255, 0), -1)
-            # else:
-            #     cv2.circle(frame, (right_x, y), 3, (0, 0, 255), -1)
-            #     cv2.circle(frame, (right_x, y + second_offset), 3, (0, 0, 255), -1)
         else:
             self.player.can_move_left = True
             self.player.can_move_right = True
             self.player.present = False
 
-    def detect_passings(self, frame):
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-        lower_green = np.array([35, 40, 40])
-        upper_green = np.array([85, 255, 255])
-        lower_gray = np.array([0, 0, 50])
-        upper_gray = np.array([180, 50, 200])
-
-        green_mask = cv2.inRange(hsv, lower_green, upper_green)
-        gray_mask = cv2.inRange(hsv, lower_gray, upper_gray)
-        outside_mask = cv2.bitwise_or(green_mask, gray_mask)
-
-        # Fill small holes in the green areas using morphological closing
-        kernel = np.ones((20, 20), np.uint8)
-        closed_outside = cv2.morphologyEx(outside_mask, cv2.MORPH_CLOSE, kernel)
-
-        # Row to analyze
-        y = 270
-        row = closed_outside[y]
-
-        # Collect non-green segments
-        self.passings = []
-        start = None
-
-        for x in range(len(row)):
-            if row[x] == 0:  # Part of the passing
-                if start is None:
-                    start = x
-                cv2.circle(frame, (x, y), radius=1, color=(0, 255, 255), thickness=1)
-            else:
-                if start is not None:
-                    self.passings.append(Passing(start, x - 1))
-                    start = None
-
-        # If segment reaches the end
-        if start is not None:
-            self.passings.append(Passing(start, len(row) - 1))
-
-    def keep_same(self, old, new):
-        result = []
-        for new_item in new:
-            match = next(
-                (old_item for old_item in old if old_item.is_same(new_item)), None
-            )
-            if match:
-                if abs(match.position[0] - new_item.position[0]) > 0:
-                    match.is_moving = True
-                match.position = new_item.position
-            result.append(match if match else new_item)
-        return result
+    def detect_passings(self, frames=1):
+        # Scroll the river map with the new bank or road pixels, then cut the lookahead row
+        self.river.update(self.perception.mask("Outside"), frames)
+        self.passings = self.river.passings(PASSING_Y)
@@ -0,0 +1,78 @@
+import json
+import hashlib
+from dataclasses import asdict, dataclass, fields
+
+
+@dataclass(frozen=True)
+class BotConfig:
+    # Every tunable number of the detectors and of Bot.action. Distances are in display
+    # pixels (see perception.py), areas in native pixels, colors are HSV [lower, upper].
+
+    # Decision
+    fuel_margin: int = 35  # Reach beyond the player's sides of the fuel depots flown to
+    aim_tolerance: int = 5  # Off-center distance an enemy still counts as aimed at
+    bridge_margin: int = 50  # Reach beyond the player's sides of the bridges shot at
+    almost_aim_margin: int = 5  # Reach of the enemies lined up for later
+    almost_aim_distance: int = 75  # Vertical distance beyond which those are lined up
+    crash_distance: int = 75  # Vertical distance below which an enemy can still be hit
+    crash_margin: int = 25  # Reach of the enemies that will crash into the player
+    moving_crash_margin: int = 75  # Same for moving enemies
+    plane_crash_distance: int = 70  # Distance to a plane's ground crossing that is a crash
+    center_margin_fuel: int = 50  # Distance from a passing center tolerated with fuel ahead
+    center_margin: int = 15  # Same without fuel ahead
+    dodge_width_ratio: int = 2  # Passing to enemy width ratio needed to dodge inside it
+
+    # Player detection and movement probes
+    player_width_tolerance: int = 5
+    probe_offset: int = 18  # Horizontal distance of the probes beyond the player's sides
+    probe_rise: int = 18  # Height of the upper probe above the player center
+    probe_height: int = 30  # Distance from the upper to the lower probe
+
+    # Blob areas accepted for every class
+    player_area: tuple = (36, 70)
+    helicopter_area: tuple = (8, 8)
+    plane_area: tuple = (18, 19)
+    boat_area: tuple = (28, 31)
+    fuel_area: tuple = (32, 32)
+    bridge_area: tuple = (48, 112)
+
+    # Color ranges, the known palette colors are labeled regardless of them
+    player_color: tuple = ((20, 100, 100), (30, 255, 255))
+    helicopter_color: tuple = ((50, 100, 50), (90, 255, 255))  # Dark green
+    plane_color: tuple = ((100, 50, 100), (140, 150, 255))  # Light blue
+    boat_color: tuple = ((0, 180, 150), (10, 255, 255))  # Dark red
+    fuel_color: tuple = ((0, 100, 100), (5, 255, 255))  # Light red
+    bridge_color: tuple = ((20, 143, 147), (40, 223, 227))  # Dark yellow
+    river_color: tuple = ((100, 100, 100), (140, 255, 255))  # Blue
+    bank_color: tuple = ((35, 40, 40), (85, 255, 255))  # Green
+    road_color: tuple = ((0, 0, 50), (180, 50, 200))  # Gray
+
+
+DEFAULT_CONFIG = BotConfig()
+
+
+def freeze(value):
+    # JSON turns tuples into lists, turn them back so configs stay hashable
+    return tuple(freeze(item) for item in value) if isinstance(value, list) else value
+
+
+def config_from_dict(values):
+    names = {field.name for field in fields(BotConfig)}
+    unknown = set(values) - names
+    if unknown:
+        raise ValueError(f"Unknown config fields: {', '.join(sorted(unknown))}")
+    return BotConfig(**{name: freeze(value) for name, value in values.items()})
+
+
+def load_config(path):
+    with open(path) as f:
+        return config_from_dict(json.load(f))
+
+
+def save_config(config, path):
+    with open(path, "w") as f:
+        json.dump(asdict(config), f, indent=2)
+
+
+def config_hash(config):
+    return hashlib.sha256(json.dumps(asdict(config), sort_keys=True).encode()).hexdigest()
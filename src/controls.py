@@ -1,4 +1,3 @@
-from time import time
 from enum import Enum
 
 class Command(Enum):
@@ -24,47 +23,62 @@ KEY_MAP = {
     ord('c'): Command.A
 }
 
-class Input():
-    def __init__(self, command):
-        self.command = command
-        self.time = time()
-    
-    def __repr__(self):
-        return f"{self.command} ({self.time})"
+BUTTON_COUNT = 9
+PRESS_FRAMES = 1  # Default press length, in emulator frames
+
 
 class Controls:
+    # Button presses are scheduled in emulator frames: update_inputs() releases the buttons
+    # whose press ran out and tick() advances one frame after every game.step(), so the
+    # same commands give the same button masks at any speed
     def __init__(self):
-        self.inputs = []
-        self.buttons = [0] * 9
+        self.frame = 0
+        self.buttons = [0] * BUTTON_COUNT
+        self.release = [0] * BUTTON_COUNT  # Frame each held button is released on
+        self.repeats = [0] * BUTTON_COUNT  # Presses still to come after the current one
+        self.durations = [PRESS_FRAMES] * BUTTON_COUNT
         self.quit = False
         self.save = False
         self.manual = False
 
     def clear_buttons(self):
-        self.buttons = [0] * 9  
-        self.inputs = []
+        for value in range(BUTTON_COUNT):
+            self.buttons[value] = 0
+            self.release[value] = 0
+            self.repeats[value] = 0
+
+    def input_commands(self, commands, hold=True, frames=PRESS_FRAMES, repeat=1):
+        # Press every command for the given frames, repeated presses are separated by as
+        # many released frames. Without hold, a button that is already down is left alone.
+        for command in commands:
+            value = command.value
+            if hold is True or self.buttons[value] == 0:
+                self.buttons[value] = 1
+                self.release[value] = self.frame + frames
+                self.repeats[value] = repeat - 1
+                self.durations[value] = frames
 
-    def input_commands(self, commands, hold=True):
-        for i, command in enumerate(commands):
-            if hold is True:
-                self.inputs = [inp for inp in self.inputs if inp.command.value != command.value]
+    def update_inputs(self):
+        for value in range(BUTTON_COUNT):
+            if self.buttons[value] == 1 and self.frame >= self.release[value]:
+                self.buttons[value] = 0
+            elif (
+                self.buttons[value] == 0
+                and self.repeats[value] > 0
+                and self.frame >= self.release[value] + self.durations[value]
+            ):
+                self.buttons[value] = 1
+                self.release[value] = self.frame + self.durations[value]
+                self.repeats[value] -= 1
 
-            if hold is True or self.buttons[command.value] == 0:
-                self.inputs.append(Input(command))
-                self.buttons[command.value] = 1
+    def hold(self, frames):
+        # Keep the buttons pressed on this frame down for at least the given frames
+        for value in range(BUTTON_COUNT):
+            if self.buttons[value] == 1 and self.release[value] > self.frame:
+                self.release[value] = max(self.release[value], self.frame + frames)
 
-    def update_inputs(self):        
-        print(self.buttons)
-        print(self.inputs)
-        current_time = time()
-        remove_count = 0
-        for input in self.inputs:
-            if current_time - input.time > 0.001:
-                self.buttons[input.command.value] = 0
-                remove_count += 1
-            else:
-                break
-        self.inputs = self.inputs[remove_count:]
+    def tick(self):
+        self.frame += 1
 
     def process_key(self, key):
         if key != 255 and key in KEY_MAP:
@@ -1,6 +1,9 @@
-import numpy as np
+# Positions and widths are in display coordinates (see perception.py). The colors and
+# areas the elements are detected by are part of the bot config (see config.py).
 
 class Element:
+    __slots__ = ("name", "_position", "width", "left", "right", "present")
+
     def __init__(self, name, position, width, present=True):
         self.name = name
         self._position = position
@@ -31,17 +34,13 @@ class Element:
     
     def y_diff(self, element):
         return self.position[1] - element.position[1]
-    
-    def is_same (self, element):
-        return self.name == element.name and abs(self.position[0] - element.position[0]) < 5 and abs(self.position[1] - element.position[1]) < 5
-    
+
     def __str__(self):
         return f"{self.name} {self.position}"
 
 
 class Player (Element):
-    color = [(20, 100, 100), (30, 255, 255)]
-    area = [200, 400] 
+    __slots__ = ("can_move_left", "can_move_right")
 
     def __init__(self, position = [0, 0]):
         super().__init__("Player", position, 20, present=(position != [0,0]))
@@ -58,106 +57,51 @@ class Player (Element):
 
 
 class Enemy (Element):
+    __slots__ = ("is_moving", "id", "velocity", "missed")
+
     def __init__(self, name, position, width):
         super().__init__(name, position, width)
         self.is_moving = False
+
+        # Track state, kept up to date by the Tracker
+        self.id = None
+        self.velocity = [0.0, 0.0]  # Display pixels per frame
+        self.missed = 0  # Frames since the last detection
         
 
 
 class Helicopter (Enemy):
-    color = [(50, 100, 50), (90, 255, 255)] # Dark Green
-    area = [50, 53]
+    __slots__ = ()
 
     def __init__(self, position):
         x, y = position
         super().__init__("Helicopter", [x-2, y], width=30)
 
 class Boat (Enemy):
-    color = [(0, 180, 150), (10, 255, 255)] # Dark Red
-    area = [200, 250]
+    __slots__ = ()
 
     def __init__(self, position):
         super().__init__("Boat", position, width=50)
 
 class Plane (Enemy):
-    color = [(100, 50, 100), (140, 150, 255)] # Light Blue
-    area = [120, 130]
+    __slots__ = ("predicted_x_at_y0",)
 
     def __init__(self, position):
+        # Filled in by the KalmanBank once the plane is tracked
         self.predicted_x_at_y0 = 0
-        self.ground_y = 450  # Bottom of the screen (reversed y-axis)
 
         super().__init__("Plane", position, width=25)
 
-        self.dt = 1.0
-
-        # Initial Kalman state: [x, y, vx, vy]
-        self.x_est = np.array([[position[0]],  # x
-                               [position[1]],  # y
-                               [0.0],          # vx
-                               [0.0]])         # vy
-
-        # State transition matrix
-        self.A = np.array([[1, 0, self.dt, 0],
-                           [0, 1, 0, self.dt],
-                           [0, 0, 1, 0],
-                           [0, 0, 0, 1]])
-
-        # Measurement matrix: we observe [x, y]
-        self.H = np.array([[1, 0, 0, 0],
-                           [0, 1, 0, 0]])
-
-        # Initial uncertainty
-        self.P = np.eye(4)
-
-        # No process or measurement noise
-        self.Q = np.zeros((4, 4))
-        self.R = np.zeros((2, 2))
-
-    @Element.position.setter
-    def position(self, position):
-        # Update the actual position
-        super(Plane, Plane).position.__set__(self, position)
-
-        # New measurement
-        z = np.array([[position[0]],
-                      [position[1]]])
-
-        # --- Predict ---
-        x_pred = self.A @ self.x_est
-        P_pred = self.A @ self.P @ self.A.T + self.Q
-
-        # --- Update ---
-        y = z - self.H @ x_pred
-        S = self.H @ P_pred @ self.H.T + self.R
-        K = P_pred @ self.H.T @ np.linalg.pinv(S)
-
-        self.x_est = x_pred + K @ y
-        self.P = (np.eye(4) - K @ self.H) @ P_pred
-
-        # --- Predict X where Y == ground_y ---
-        x_now, y_now, vx, vy = self.x_est.flatten()
-        if abs(vy) > 1e-8:
-            t_to_ground = (self.ground_y - y_now) / vy
-            if t_to_ground > 0:
-                x_at_y0 = x_now + vx * t_to_ground
-            else:
-                x_at_y0 = np.nan  # Already hit ground or going up
-        else:
-            x_at_y0 = np.nan  # No vertical velocity
-
-        self.predicted_x_at_y0 = x_at_y0 % 455
-
 
 class Fuel (Element):
-    color = [(0, 100, 100), (5, 255, 255)] # Light Red
-    area = [229.5, 229.5]
+    __slots__ = ()
 
     def __init__(self, position):
         super().__init__("Fuel", position, width=20)
 
 
 class Passing (Element):
+    __slots__ = ()
     def __init__(self, start, end):
         super().__init__("Passing", [(end + start) // 2, 10], end - start)
     
@@ -165,8 +109,7 @@ class Passing (Element):
         return self.left <= element.left and self.right >= element.right
     
 class Bridge (Enemy):
-    color = [(20, 143, 147), (40, 223, 227)] # Dark yellow
-    area = [200, 1000]
+    __slots__ = ()
 
     def __init__(self, position):
         super().__init__("Bridge", position, width=100)
\ No newline at end of file
@@ -0,0 +1,245 @@
+import time
+import argparse
+
+import gymnasium as gym
+import numpy as np
+import retro
+from gymnasium import spaces
+from gymnasium.vector import AsyncVectorEnv, SyncVectorEnv
+
+from bot import Bot, START_DELAY
+from controls import BUTTON_COUNT, Command, Controls
+from library import StateLibrary, load_state
+from perception import LABEL_NAMES
+from ram import GameRAM
+from workers import add_start_arguments
+
+# Button combinations the agent picks from, one per discrete action
+ACTIONS = [
+    [],
+    [Command.B],
+    [Command.LEFT],
+    [Command.RIGHT],
+    [Command.UP],
+    [Command.DOWN],
+    [Command.LEFT, Command.B],
+    [Command.RIGHT, Command.B],
+]
+ACTION_MASKS = [
+    [int(any(command.value == button for command in commands)) for button in range(BUTTON_COUNT)]
+    for commands in ACTIONS
+]
+START_MASK = [int(button == Command.START.value) for button in range(BUTTON_COUNT)]
+
+# Feature observation: nearest entities first, unused rows are zero
+MAX_OBJECTS = 16  # Rows of label, x, y, x velocity, y velocity, width
+MAX_PASSINGS = 4  # Rows of left, right
+OBJECT_FEATURES = 6
+
+SURVIVAL_REWARD = 0.01  # Per frame alive, on top of the points scored
+DEATH_PENALTY = 100  # Points lost with every life
+MAX_BOOT_FRAMES = 600  # Frames waited for the game to start after pressing start
+NOOP_MAX = 30  # Random idle frames after a reset, so seeded episodes differ
+
+
+class RiverRaidEnv(gym.Env):
+    # The emulator as a gymnasium environment. Observations are either the raw screen or the
+    # entities the bot's detectors extract; rewards are points plus a small survival bonus.
+    # stable-retro allows one emulator per process, see make_vector_env for many of them.
+    metadata = {"render_modes": ["rgb_array"]}
+
+    def __init__(
+        self,
+        rom="river-raid.a26",
+        state=None,
+        observation="features",
+        perception="vision",
+        frame_skip=4,
+        max_frames=20000,
+        render_mode=None,
+        library=None,
+        section=None,
+        min_difficulty=0,
+    ):
+        self.game = retro.RetroEmulator(rom)
+        self.ram = GameRAM(self.game)
+        if not load_state(self.game, state):
+            self.boot()
+        self.start_state = self.game.get_state()
+        # Episodes start from a random library state when given one (see library.py)
+        self.library = StateLibrary(library) if library is not None else None
+        self.section = section
+        self.min_difficulty = min_difficulty
+        self.observation = observation
+        self.ram_perception = perception == "ram"
+        self.frame_skip = frame_skip
+        self.max_frames = max_frames
+        self.render_mode = render_mode
+        self.screen = None
+        self.bot = None
+
+        self.action_space = spaces.Discrete(len(ACTIONS))
+        if observation == "frame":
+            shape = self.game.get_screen().shape
+            self.observation_space = spaces.Box(0, 255, shape, np.uint8)
+        else:
+            self.observation_space = spaces.Dict({
+                "player": spaces.Box(-np.inf, np.inf, (4,), np.float32),  # x, present, fuel, lives
+                "objects": spaces.Box(-np.inf, np.inf, (MAX_OBJECTS, OBJECT_FEATURES), np.float32),
+                "passings": spaces.Box(-np.inf, np.inf, (MAX_PASSINGS, 2), np.float32),
+            })
+
+    def boot(self):
+        # From power-on, press start like the bot does and wait for the lives to show up
+        for _ in range(START_DELAY):
+            self.game.step()
+        self.game.set_button_mask(START_MASK)
+        self.game.step()
+        self.game.set_button_mask(ACTION_MASKS[0])
+        for _ in range(MAX_BOOT_FRAMES):
+            if not self.ram.game_over:
+                break
+            self.game.step()
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        start_state = self.start_state
+        if self.library is not None:
+            start_state = self.library.sample(self.np_random, self.section, self.min_difficulty)
+        self.game.set_state(start_state)
+        self.game.set_button_mask(ACTION_MASKS[0])
+        self.game.step()  # Screen is only valid after stepping a restored state
+        for _ in range(self.np_random.integers(NOOP_MAX + 1)):
+            self.game.step()
+
+        self.bot = Bot(Controls(), auto_start=True, ram=self.ram if self.ram_perception else None)
+        self.frames = 0
+        self.score = self.ram.score
+        self.lives = self.ram.lives
+        self.screen = self.game.get_screen()
+        return self.observe(self.frame_skip), self.info()
+
+    def step(self, action):
+        self.game.set_button_mask(ACTION_MASKS[action])
+        reward = 0.0
+        terminated = False
+        for _ in range(self.frame_skip):
+            self.game.step()
+            self.frames += 1
+            if self.ram.game_over:
+                terminated = True
+                break
+            reward += SURVIVAL_REWARD
+
+        # Points scored and lives lost during the repeated frames
+        score, lives = self.ram.score, self.ram.lives
+        reward += score - self.score
+        if terminated or lives < self.lives:
+            reward -= DEATH_PENALTY
+        self.score = score
+        self.lives = lives if lives is not None else 0
+        truncated = not terminated and self.frames >= self.max_frames
+
+        self.screen = self.game.get_screen()
+        return self.observe(self.frame_skip), reward, terminated, truncated, self.info()
+
+    def observe(self, frames):
+        if self.observation == "frame":
+            return self.screen
+
+        bot = self.bot
+        bot.perceive(self.screen, frames)
+        player = bot.player
+        elements = sorted(bot.enemies + bot.fuels, key=lambda e: e.position[1], reverse=True)
+        objects = np.zeros((MAX_OBJECTS, OBJECT_FEATURES), np.float32)
+        for row, element in zip(objects, elements):
+            velocity = getattr(element, "velocity", (0, 0))
+            row[:] = (LABEL_NAMES.index(element.name), *element.position, *velocity, element.width)
+        passings = np.zeros((MAX_PASSINGS, 2), np.float32)
+        for row, passing in zip(passings, bot.passings):
+            row[:] = (passing.left, passing.right)
+        return {
+            "player": np.array(
+                [player.position[0], player.present, self.ram.fuel, self.lives], np.float32
+            ),
+            "objects": objects,
+            "passings": passings,
+        }
+
+    def info(self):
+        return {"score": self.score, "lives": self.lives, "fuel": self.ram.fuel, "frames": self.frames}
+
+    def render(self):
+        if self.render_mode == "rgb_array":
+            return self.screen
+
+
+def make_env(**kwargs):
+    # Environment factory for the vector environments, the emulator is created where it runs
+    return lambda: RiverRaidEnv(**kwargs)
+
+
+def make_vector_env(num_envs, asynchronous=True, **kwargs):
+    # One worker process per environment; in-process envs can only hold a single emulator
+    if not asynchronous and num_envs > 1:
+        raise ValueError("stable-retro allows one emulator per process, use asynchronous envs")
+    vector = AsyncVectorEnv if asynchronous else SyncVectorEnv
+    return vector([make_env(**kwargs) for _ in range(num_envs)])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="River Raid gymnasium environment rollouts")
+    add_start_arguments(parser)
+    parser.add_argument(
+        "--envs", type=int, default=4,
+        help="Number of environments, each in its own process"
+    )
+    parser.add_argument(
+        "--steps", type=int, default=1000,
+        help="Random policy steps taken in every environment"
+    )
+    parser.add_argument(
+        "--observation", choices=["features", "frame"], default="features",
+        help="Detected entities (features) or the raw screen (frame) (default: features)"
+    )
+    parser.add_argument(
+        "--perception", choices=["vision", "ram"], default="vision",
+        help="Read entities from the screen (vision) or from the game RAM (default: vision)"
+    )
+    parser.add_argument(
+        "--frame-skip", type=int, default=4,
+        help="Emulator frames every action is repeated for (default: 4)"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    envs = make_vector_env(
+        args.envs,
+        rom=args.rom,
+        state=args.state,
+        observation=args.observation,
+        perception=args.perception,
+        frame_skip=args.frame_skip,
+        library=args.library,
+        section=args.section,
+        min_difficulty=args.min_difficulty,
+    )
+    envs.reset(seed=0)
+
+    start = time.perf_counter()
+    episodes = 0
+    for _ in range(args.steps):
+        _, _, terminated, truncated, _ = envs.step(envs.action_space.sample())
+        episodes += int(np.count_nonzero(terminated | truncated))
+    elapsed = time.perf_counter() - start
+    envs.close()
+
+    steps = args.steps * args.envs
+    print(f"{steps} steps ({steps * args.frame_skip} frames) in {elapsed:.1f}s, {episodes} episodes")
+    print(f"Throughput: {steps / elapsed:.1f} steps/s, {steps * args.frame_skip / elapsed:.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
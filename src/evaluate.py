@@ -0,0 +1,223 @@
+import time
+import json
+import argparse
+import multiprocessing
+import numpy as np
+
+from bot import Bot
+from config import DEFAULT_CONFIG, load_config
+from controls import Controls
+from ram import FUEL_EMPTY
+from workers import add_start_arguments, init_emulator, worker
+
+RESPAWN_REFILL = 50  # A fuel jump bigger than this means a new plane was spawned
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="River Raid Bot parallel evaluation")
+    add_start_arguments(parser)
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Seed of the library states the episodes start from"
+    )
+    parser.add_argument(
+        "--episodes", type=int, default=100,
+        help="Number of episodes to run"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=multiprocessing.cpu_count(),
+        help="Number of worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--max-frames", type=int, default=20000,
+        help="Frame limit per episode"
+    )
+    parser.add_argument(
+        "--perception", choices=["vision", "ram"], default="vision",
+        help="Read entities from the screen (vision) or from the game RAM (default: vision)"
+    )
+    parser.add_argument(
+        "--frame-skip", type=int, default=1,
+        help="Most frames the bot repeats its buttons for before deciding again (default: 1)"
+    )
+    parser.add_argument(
+        "--config", type=str,
+        help="JSON file with the bot thresholds to use (default: the built-in ones)"
+    )
+    parser.add_argument(
+        "--output", type=str,
+        help="Optional JSON file to write per-episode results and statistics"
+    )
+    return parser.parse_args()
+
+
+def init_worker(rom, state, perception, frame_skip, config, library, section, min_difficulty):
+    init_emulator(rom, state, library, section, min_difficulty)
+    worker["ram_perception"] = perception == "ram"
+    worker["frame_skip"] = frame_skip
+    worker["config"] = config
+
+
+def death_cause(fuel):
+    return "fuel" if fuel <= FUEL_EMPTY else "collision"
+
+
+def run_episode(
+    game,
+    ram,
+    start_state,
+    auto_start,
+    max_frames,
+    ram_perception=False,
+    frame_skip=1,
+    config=DEFAULT_CONFIG,
+):
+    game.set_state(start_state)
+    game.step()  # Screen is only valid after stepping a restored state
+    controls = Controls()
+    bot = Bot(
+        controls, auto_start=auto_start, ram=ram if ram_perception else None,
+        frame_skip=frame_skip, config=config, game_ram=ram
+    )
+
+    frames = 0
+    score = 0
+    deaths = []
+    lives = None
+    fuel = ram.fuel
+    death_fuel = fuel
+
+    while frames < max_frames:
+        bot.refresh(game.get_screen())
+        controls.update_inputs()
+        game.set_button_mask(controls.buttons)
+        game.step()
+        controls.tick()
+        frames += 1
+
+        if not bot.started:
+            continue
+
+        # The tank is refilled when the next plane spawns, so keep the level it died with
+        last_fuel, fuel = fuel, ram.fuel
+        if fuel - last_fuel > RESPAWN_REFILL:
+            death_fuel = last_fuel
+
+        if ram.game_over:
+            if lives is not None:
+                deaths.append(death_cause(fuel))
+                break
+            continue
+
+        if lives is not None and ram.lives < lives:
+            deaths.append(death_cause(death_fuel))
+        lives = ram.lives
+        score = ram.score
+
+    return {
+        "score": score,
+        "frames": frames,
+        "deaths": deaths,
+        "cause": deaths[-1] if ram.game_over and deaths else "timeout",
+    }
+
+
+def worker_episode(task):
+    max_frames, seed = task
+    start_state, auto_start = worker["start_state"], worker["auto_start"]
+    if worker["library"] is not None:
+        rng = np.random.default_rng(seed)
+        start_state = worker["library"].sample(rng, worker["section"], worker["min_difficulty"])
+        auto_start = True
+    return run_episode(
+        worker["game"],
+        worker["ram"],
+        start_state,
+        auto_start,
+        max_frames,
+        worker["ram_perception"],
+        worker["frame_skip"],
+        worker["config"],
+    )
+
+
+def summarize(results, elapsed):
+    summary = {"episodes": len(results)}
+    for key in ["score", "frames"]:
+        values = np.array([result[key] for result in results])
+        summary[key] = {
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+            "min": int(values.min()),
+            "max": int(values.max()),
+            **{f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES},
+        }
+
+    # How every episode ended, and what every life was lost to
+    causes = {}
+    deaths = {}
+    for result in results:
+        causes[result["cause"]] = causes.get(result["cause"], 0) + 1
+        for cause in result["deaths"]:
+            deaths[cause] = deaths.get(cause, 0) + 1
+    summary["causes"] = causes
+    summary["deaths"] = deaths
+
+    total_frames = sum(result["frames"] for result in results)
+    summary["elapsed"] = elapsed
+    summary["frames_per_second"] = total_frames / elapsed
+    summary["episodes_per_second"] = len(results) / elapsed
+    return summary
+
+
+def print_summary(summary):
+    print(f"Episodes: {summary['episodes']}")
+    for key in ["score", "frames"]:
+        stats = summary[key]
+        percentiles = ", ".join(f"p{p} {stats[f'p{p}']:.0f}" for p in PERCENTILES)
+        print(
+            f"{key.capitalize():<8} mean {stats['mean']:.1f} (std {stats['std']:.1f}), "
+            f"min {stats['min']}, max {stats['max']}, {percentiles}"
+        )
+    print(f"Causes:  {summary['causes']}")
+    print(f"Deaths:  {summary['deaths']}")
+    print(
+        f"Throughput: {summary['frames_per_second']:.1f} frames/s, "
+        f"{summary['episodes_per_second']:.2f} episodes/s ({summary['elapsed']:.1f}s)"
+    )
+
+
+def main():
+    args = parse_args()
+    config = load_config(args.config) if args.config else DEFAULT_CONFIG
+
+    results = []
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(
+        args.workers,
+        initializer=init_worker,
+        initargs=(
+            args.rom, args.state, args.perception, args.frame_skip, config,
+            args.library, args.section, args.min_difficulty,
+        ),
+    ) as pool:
+        tasks = [(args.max_frames, args.seed + episode) for episode in range(args.episodes)]
+        for result in pool.imap_unordered(worker_episode, tasks):
+            results.append(result)
+            print(
+                f"Episode {len(results)}/{args.episodes}: score {result['score']}, "
+                f"{result['frames']} frames, {result['cause']}"
+            )
+    elapsed = time.perf_counter() - start_time
+
+    summary = summarize(results, elapsed)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "episodes": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import numpy as np
+
+# Constant velocity Kalman filters for every tracked plane, stored as one struct of arrays.
+# State is [x, y, vx, vy] in display coordinates and velocities are per emulator frame, the
+# measurement is [x, y].
+MAX_PLANES = 8  # Filters preallocated in the bank
+GROUND_Y = 450  # Bottom of the screen (reversed y-axis)
+WRAP_X = 455  # Planes leaving one side of the screen come back on the other
+
+Q = np.zeros((4, 4))  # No process noise
+R = np.zeros((2, 2))  # No measurement noise
+SINGULAR = 1e-12
+
+
+class KalmanBank:
+    def __init__(self, capacity=MAX_PLANES):
+        self.capacity = capacity
+        self.state = np.zeros((capacity, 4, 1))
+        self.P = np.zeros((capacity, 4, 4))
+        self.slots = {}  # Track id to filter index
+        self.predicted_x = np.full(capacity, np.nan)  # X where each plane reaches GROUND_Y
+
+        # Work buffers, every step reuses them. The transition covers the frames since the last
+        # update: [[1, 0, dt, 0], [0, 1, 0, dt], [0, 0, 1, 0], [0, 0, 0, 1]].
+        self.A = np.eye(4)
+        self.active = np.zeros(capacity, bool)
+        self.measured = np.zeros(capacity, bool)
+        self.z = np.zeros((capacity, 2, 1))
+        self.AP = np.zeros((capacity, 4, 4))
+        self.P_pred = np.zeros((capacity, 4, 4))
+        self.x_pred = np.zeros((capacity, 4, 1))
+        self.S = np.zeros((capacity, 2, 2))
+        self.S_inv = np.zeros((capacity, 2, 2))
+        self.det = np.zeros(capacity)
+        self.trace = np.zeros(capacity)
+        self.scale = np.zeros(capacity)
+        self.full_rank = np.zeros(capacity, bool)
+        self.rank_one = np.zeros(capacity, bool)
+        self.scratch = np.zeros(capacity)
+        self.flags = np.zeros(capacity, bool)
+        self.K = np.zeros((capacity, 4, 2))
+        self.innovation = np.zeros((capacity, 2, 1))
+        self.correction = np.zeros((capacity, 4, 1))
+        self.KHP = np.zeros((capacity, 4, 4))
+        self.t_to_ground = np.zeros(capacity)
+
+    def update(self, planes, frames=1):
+        # Advance every filter by the frames since the last update at once and correct the ones
+        # of planes measured now; planes lose their filter with their track
+        alive = {plane.id for plane in planes}
+        for track_id in [track_id for track_id in self.slots if track_id not in alive]:
+            del self.slots[track_id]
+
+        self.active[:] = False
+        self.measured[:] = False
+        for plane in planes:
+            slot = self.slots.get(plane.id)
+            if slot is not None:
+                self.active[slot] = True
+                if plane.present:
+                    self.measured[slot] = True
+                    self.z[slot, :, 0] = plane.position
+        if self.active.any():
+            self.step(frames)
+
+        # New filters start at their first measurement, after the others moved on
+        for plane in planes:
+            if plane.id not in self.slots:
+                self.add(plane)
+
+        for plane in planes:
+            if plane.id in self.slots:
+                plane.predicted_x_at_y0 = self.predicted_x[self.slots[plane.id]].item()
+
+    def add(self, plane):
+        # A new filter starts at the first position with no velocity and unit uncertainty
+        free = [i for i in range(self.capacity) if i not in self.slots.values()]
+        if not free:
+            return  # Bank full, this plane goes unfiltered
+        slot = free[0]
+        self.slots[plane.id] = slot
+        self.state[slot] = [[plane.position[0]], [plane.position[1]], [0.0], [0.0]]
+        self.P[slot] = np.eye(4)
+        self.predicted_x[slot] = 0
+
+    def step(self, frames):
+        # --- Predict --- (coasting planes keep the prediction)
+        A = self.A
+        A[0, 2] = A[1, 3] = frames
+        np.matmul(A, self.state, out=self.x_pred)
+        np.matmul(A, self.P, out=self.AP)
+        np.matmul(self.AP, A.T, out=self.P_pred)
+        self.P_pred += Q
+
+        # --- Update --- (H observes x and y, so H P H^T is the top-left block)
+        self.invert_innovation()
+        np.matmul(self.P_pred[:, :, :2], self.S_inv, out=self.K)
+        np.subtract(self.z, self.x_pred[:, :2], out=self.innovation)
+        np.matmul(self.K, self.innovation, out=self.correction)
+        np.matmul(self.K, self.P_pred[:, :2], out=self.KHP)
+
+        active = self.active[:, None, None]
+        np.copyto(self.state, self.x_pred, where=active)
+        np.copyto(self.P, self.P_pred, where=active)
+        measured = self.measured[:, None, None]
+        np.add(self.x_pred, self.correction, out=self.state, where=measured)
+        np.subtract(self.P_pred, self.KHP, out=self.P, where=measured)
+
+        self.predict_ground_x()
+
+    def invert_innovation(self):
+        # Closed form pseudo inverse of the symmetric 2x2 innovation covariance S: the adjugate
+        # over the determinant, S / trace^2 when it has rank one and zero when it vanishes
+        S, det, trace, scale, scratch = self.S, self.det, self.trace, self.scale, self.scratch
+        full_rank, rank_one = self.full_rank, self.rank_one
+        np.add(self.P_pred[:, :2, :2], R, out=S)
+        a, b, d = S[:, 0, 0], S[:, 0, 1], S[:, 1, 1]
+        np.multiply(a, d, out=det)
+        np.subtract(det, np.multiply(b, b, out=scratch), out=det)
+        np.add(a, d, out=trace)
+
+        np.greater(np.abs(det, out=scratch), SINGULAR, out=full_rank)
+        scale.fill(0)
+        np.divide(1.0, det, out=scale, where=full_rank)
+        np.greater(trace, SINGULAR, out=rank_one)
+        np.logical_and(rank_one, np.logical_not(full_rank, out=self.flags), out=rank_one)
+        np.divide(1.0, np.multiply(trace, trace, out=scratch), out=scale, where=rank_one)
+
+        # Full rank: [[d, -b], [-b, a]] * scale, rank one: [[a, b], [b, d]] * scale
+        S_inv = self.S_inv
+        np.copyto(S_inv, S)
+        np.copyto(S_inv[:, 1, 0], b)
+        np.copyto(S_inv[:, 0, 0], d, where=full_rank)
+        np.copyto(S_inv[:, 1, 1], a, where=full_rank)
+        np.negative(b, out=S_inv[:, 0, 1], where=full_rank)
+        np.negative(b, out=S_inv[:, 1, 0], where=full_rank)
+        np.multiply(S_inv, scale[:, None, None], out=S_inv)
+
+    def predict_ground_x(self):
+        # --- Predict X where Y == GROUND_Y --- for every filtered plane
+        x, y, vx, vy = self.state[:, :, 0].T
+        moving, scratch, t = self.flags, self.scratch, self.t_to_ground
+        np.greater(np.abs(vy, out=scratch), 1e-8, out=moving)
+        np.logical_and(moving, self.active, out=moving)
+        t.fill(-1)
+        np.divide(np.subtract(GROUND_Y, y, out=scratch), vy, out=t, where=moving)
+
+        # Not yet on the ground and going down, the others have no crossing
+        falling = np.greater(t, 0, out=moving)
+        np.multiply(vx, t, out=scratch)
+        np.add(scratch, x, out=scratch)
+        np.remainder(scratch, WRAP_X, out=scratch)
+        np.logical_and(falling, self.active, out=falling)
+        np.copyto(self.predicted_x, np.nan, where=self.active)
+        np.copyto(self.predicted_x, scratch, where=falling)
@@ -0,0 +1,191 @@
+import os
+import json
+import zlib
+import hashlib
+import argparse
+
+import retro
+
+from bot import Bot, NARROW_PASSING
+from controls import Controls
+from ram import GameRAM
+
+# Library directory: objects/<sha256 of the state>.z holds every state zlib compressed, so the
+# same state is stored once whatever captured it, and index.json describes them
+OBJECTS = "objects"
+INDEX = "index.json"
+
+# Sections of the river a state starts in, in the order they are recognized
+SECTIONS = ["bridge", "canyon", "fuel", "river"]
+# The core serializes 16 bytes of uninitialized memory into River Raid's 481 byte states. They
+# differ between identical games and restoring ignores them, so they are zeroed before hashing.
+STATE_SIZE = 481
+UNSET_BYTES = slice(377, 393)
+
+CAPTURE_DELAY = 60  # Frames after the start before states are captured, the river is empty
+
+
+def load_state(game, path):
+    if path is None or not os.path.exists(path):
+        print("No saved state.")
+        return False
+    
+    with open(path, "rb") as f:
+        game.set_state(f.read())
+    print("State loaded.")
+    return True
+
+
+def save_state(game, path):
+    with open(path, "wb") as f:
+        f.write(game.get_state())
+
+
+def canonical(state):
+    if len(state) != STATE_SIZE:
+        return state
+    state = bytearray(state)
+    state[UNSET_BYTES] = bytes(UNSET_BYTES.stop - UNSET_BYTES.start)
+    return bytes(state)
+
+
+def state_hash(state):
+    return hashlib.sha256(canonical(state)).hexdigest()
+
+
+def classify(bot):
+    # Section and difficulty of what the bot sees: a bridge, a narrow passing or fuel depots
+    # ahead, and the enemies plus narrow passings it has to get past
+    narrow = sum(passing.width < NARROW_PASSING for passing in bot.passings)
+    if any(enemy.name == "Bridge" for enemy in bot.enemies):
+        section = "bridge"
+    elif narrow:
+        section = "canyon"
+    elif bot.fuels:
+        section = "fuel"
+    else:
+        section = "river"
+    return section, len(bot.enemies) + narrow
+
+
+class StateLibrary:
+    # Start states along the river, all decompressed into memory when the library is opened,
+    # so picking one costs nothing but game.set_state
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # State hash to its section, difficulty and where it was captured
+        self.states = {}
+        index = os.path.join(path, INDEX)
+        if os.path.exists(index):
+            with open(index) as f:
+                self.entries = json.load(f)
+        for key in self.entries:
+            with open(self.object_path(key), "rb") as f:
+                self.states[key] = zlib.decompress(f.read())
+
+    def object_path(self, key):
+        return os.path.join(self.path, OBJECTS, f"{key}.z")
+
+    def add(self, state, section, difficulty, **info):
+        # Store a state unless the library holds it already, returns its hash
+        state = canonical(state)
+        key = state_hash(state)
+        if key not in self.states:
+            os.makedirs(os.path.join(self.path, OBJECTS), exist_ok=True)
+            with open(self.object_path(key), "wb") as f:
+                f.write(zlib.compress(state, 9))
+            self.states[key] = state
+            self.entries[key] = {"section": section, "difficulty": difficulty, **info}
+        return key
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, INDEX), "w") as f:
+            json.dump(self.entries, f, indent=2)
+
+    def select(self, section=None, min_difficulty=0):
+        # Hashes of the states in a section (any if None) at least that difficult, sorted so
+        # sampling with a seed picks the same states on every run
+        return sorted(
+            key
+            for key, entry in self.entries.items()
+            if (section is None or entry["section"] == section)
+            and entry["difficulty"] >= min_difficulty
+        )
+
+    def sample(self, rng, section=None, min_difficulty=0):
+        keys = self.select(section, min_difficulty)
+        if not keys:
+            raise ValueError(f"No {section or 'any'} state of difficulty {min_difficulty} or more")
+        return self.states[keys[int(rng.integers(len(keys)))]]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="River Raid start state library")
+    parser.add_argument(
+        "--rom", type=str, default="river-raid.a26",
+        help="Path to the game ROM file (default: river-raid.a26)"
+    )
+    parser.add_argument(
+        "--state", type=str,
+        help="Path to the saved state file the capture game starts from (default: power-on)"
+    )
+    parser.add_argument(
+        "--library", type=str, default="states/library",
+        help="Library directory, created if missing and added to otherwise"
+    )
+    parser.add_argument(
+        "--frames", type=int, default=6000,
+        help="Frames the bot plays to capture states, 0 only lists the library"
+    )
+    parser.add_argument(
+        "--every", type=int, default=60,
+        help="Frames between captured states"
+    )
+    return parser.parse_args()
+
+
+def capture(game, ram, library, auto_start, frames, every):
+    # The rules bot plays and a state is kept every few frames while it flies, until game over
+    controls = Controls()
+    bot = Bot(controls, auto_start=auto_start, game_ram=ram)
+    added = 0
+    flying = 0
+    for frame in range(frames):
+        bot.refresh(game.get_screen())
+        if bot.started and not ram.game_over and bot.player.present and not ram.crashed:
+            flying += 1
+            if flying > CAPTURE_DELAY and flying % every == 0:
+                section, difficulty = classify(bot)
+                count = len(library.states)
+                library.add(game.get_state(), section, difficulty, frame=frame, score=ram.score)
+                added += len(library.states) - count
+        elif flying and ram.game_over:
+            break
+        controls.update_inputs()
+        game.set_button_mask(controls.buttons)
+        game.step()
+        controls.tick()
+    return added
+
+
+def main():
+    args = parse_args()
+    library = StateLibrary(args.library)
+
+    if args.frames > 0:
+        game = retro.RetroEmulator(args.rom)
+        auto_start = load_state(game, args.state)
+        added = capture(game, GameRAM(game), library, auto_start, args.frames, args.every)
+        library.save()
+        print(f"Added {added} states to {args.library}")
+
+    print(f"{len(library.states)} states")
+    for section in SECTIONS:
+        difficulties = [library.entries[key]["difficulty"] for key in library.select(section)]
+        if difficulties:
+            print(f"  {section:<7} {len(difficulties):>5}, difficulty {min(difficulties)}-{max(difficulties)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 import retro
-import cv2
 import time
-import os
 import argparse
+import atexit
+
+import numpy as np
 
 from bot import Bot
+from config import DEFAULT_CONFIG, load_config
 from controls import Controls
+from library import load_state, save_state
+from renderer import Renderer
+from planner import PlannerBot
+from profiler import Profiler, NullProfiler
+from pipeline import IDLE_MASK, Pipeline
+from qlearning import QBot
+from ram import GameRAM
+from recording import InputRecorder
 
 def parse_args():
     parser = argparse.ArgumentParser(description="River Raid Bot Controller")
@@ -21,36 +31,76 @@ def parse_args():
         "--fps", type=int, default=60,
         help="Game FPS"
     )
-    return parser.parse_args()
-
-def load_state(game, path):
-    if path is None or not os.path.exists(path):
-        print("No saved state.")
-        return False
-    
-    with open(path, "rb") as f:
-        game.set_state(f.read())
-    print("State loaded.")
-    return True
-
-
-def save_state(game, path):
-    with open(path, "wb") as f:
-        f.write(game.get_state())
-
-
-def get_frame(game):
-    CROP_TOP = 6
-    CROP_BOTTOM = 602
-    CROP_LEFT = 24
-    CROP_RIGHT = 480
-
-    frame = game.get_screen()
-    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) # Convert the screen to BGR format
-    scaled_frame = cv2.resize(frame, None, fx=3, fy=3, interpolation=cv2.INTER_NEAREST) # Resize the screen for better visibility
-    real_frame = scaled_frame[CROP_TOP:CROP_BOTTOM, CROP_LEFT:CROP_RIGHT]
-    return real_frame
-    
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="Run without windows or debug drawing, as fast as possible"
+    )
+    parser.add_argument(
+        "--no-overlay", action="store_true",
+        help="Only show the game window, without the perception overlays"
+    )
+    parser.add_argument(
+        "--max-frames", type=int,
+        help="Stop after this many frames"
+    )
+    parser.add_argument(
+        "--max-episodes", type=int,
+        help="Stop after this many episodes (games over, needs --headless)"
+    )
+    parser.add_argument(
+        "--perception", choices=["vision", "ram"], default="vision",
+        help="Read entities from the screen (vision) or from the game RAM (default: vision)"
+    )
+    parser.add_argument(
+        "--frame-skip", type=int, default=1,
+        help="Most frames the bot repeats its buttons for before deciding again, fewer near threats (default: 1)"
+    )
+    parser.add_argument(
+        "--config", type=str,
+        help="JSON file with the bot thresholds to use, as written by search.py"
+    )
+    parser.add_argument(
+        "--qtable", type=str,
+        help="Play the greedy actions of this Q-table (see qlearning.py) instead of the rules"
+    )
+    parser.add_argument(
+        "--planner", action="store_true",
+        help="Choose every action by emulating the candidates ahead (see planner.py)"
+    )
+    parser.add_argument(
+        "--plan-budget", type=float, default=200,
+        help="Milliseconds the planner may spend on a decision (default: 200)"
+    )
+    parser.add_argument(
+        "--pipeline", type=int, metavar="LATENCY",
+        help="Run the bot on its own thread, playing each decision this many frames later (see pipeline.py)"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Time every stage of the frame and print p50/p95/p99 durations at exit"
+    )
+    parser.add_argument(
+        "--profile-trace", type=str,
+        help="Write the per-frame stage durations to this .csv or .json file (implies --profile)"
+    )
+    parser.add_argument(
+        "--record", type=str,
+        help="Write the start state and every frame's buttons to this input log"
+    )
+    parser.add_argument(
+        "--record-frames", type=str,
+        help="Also store every screen in this memory-mapped .npy file (needs --record)"
+    )
+    args = parser.parse_args()
+    if args.max_episodes is not None and not args.headless:
+        parser.error("--max-episodes counts the games over of --headless runs only")
+    if args.record_frames is not None and args.record is None:
+        parser.error("--record-frames stores the screens of a --record log")
+    if args.pipeline is not None and args.pipeline < 1:
+        parser.error("--pipeline needs a latency of at least one frame")
+    if args.pipeline is not None and args.planner:
+        parser.error("--planner emulates on the bot's thread and cannot run in a --pipeline")
+    return args
 
 
 def main ():
@@ -59,36 +109,157 @@ def main ():
     # Initialize game and bot
     game = retro.RetroEmulator(args.rom)
     game_load = load_state(game, args.state)
+    start_state = game.get_state()
+    ram = GameRAM(game)
     controls = Controls()
-    bot = Bot(controls, auto_start=game_load)
+    bot_ram = ram if args.perception == "ram" else None
+    profiling = args.profile or args.profile_trace is not None
+    profiler = Profiler() if profiling else NullProfiler()
+    # A pipelined bot times its stages on its own thread, one row per decision
+    bot_profiler = profiler
+    if args.pipeline is not None:
+        bot_profiler = Profiler() if profiling else NullProfiler()
+    config = load_config(args.config) if args.config else DEFAULT_CONFIG
+    options = dict(
+        auto_start=game_load, ram=bot_ram, profiler=bot_profiler, frame_skip=args.frame_skip,
+        config=config, game_ram=ram
+    )
+    if args.qtable is not None:
+        table = np.load(args.qtable, mmap_mode="r")
+        new_bot = lambda: QBot(controls, table, **options)
+    elif args.planner:
+        budget = args.plan_budget / 1000
+        new_bot = lambda: PlannerBot(controls, game, budget=budget, **options)
+    else:
+        new_bot = lambda: Bot(controls, **options)
+    bot = new_bot()
+    renderer = None
+    if not args.headless:
+        renderer = Renderer(overlay=not args.no_overlay)
+        renderer.start()
+
+    pipeline = None
+    if args.pipeline is not None:
+        shape = game.get_screen().shape
+        pipeline = Pipeline(bot, controls, shape, latency=args.pipeline, snapshots=renderer is not None)
+        pipeline.start()
+
+    recorder = None
+    if args.record is not None:
+        shape = game.get_screen().shape
+        recorder = InputRecorder(args.record, start_state, args.record_frames, shape)
+        atexit.register(recorder.close)  # Keep the log of runs that crash
+
+    frames = 0
+    episodes = 0
+    rollouts = reused = 0  # Planner rollouts of the bots of finished episodes
+    score = 0
+    playing = False
+    run_start = time.perf_counter()
 
     while True:
         # Frame Start
         start_time = time.perf_counter()
-        key = cv2.waitKey(1)
+        key = 255 if renderer is None else renderer.key()
 
-        # Display game and refresh bot state
-        frame = get_frame(game)
-        cv2.imshow("River Raid", frame)
-        bot.refresh(frame)
+        # Refresh bot state, the render thread shows the frame
+        screen = game.get_screen()
+        lap = profiler.lap("get_screen", start_time)
+        if pipeline is None:
+            bot.refresh(screen)
+            lap = time.perf_counter()
+            if renderer is not None:
+                renderer.submit(screen, bot.snapshot())
+                lap = profiler.lap("display", lap)
 
-        # Update controls + manual input
-        controls.update_inputs()
-        controls.process_key(key)
-        game.set_button_mask(controls.buttons)
+            # Update controls + manual input
+            controls.update_inputs()
+            controls.process_key(key)
+            buttons = controls.buttons
+        else:
+            # The bot thread decides from this frame while the emulator steps it
+            pipeline.submit(screen, key)
+            decision = pipeline.decision()
+            lap = profiler.lap("decision", lap)
+            buttons = IDLE_MASK
+            if decision is not None:
+                buttons, snapshot = decision
+                if renderer is not None:
+                    renderer.submit(screen, snapshot)  # Overlays lag the screen by the latency
+                    lap = profiler.lap("display", lap)
+        game.set_button_mask(buttons)
         if controls.save:
             save_state(game, args.state)
             controls.save = False
         if controls.quit:
             break
+        if recorder is not None:
+            recorder.record(buttons, screen)
+        lap = profiler.lap("controls", lap)
 
-        # Game FPS management
         game.step()
-        elapsed = time.perf_counter() - start_time
-        time.sleep(max(0, 1/args.fps - elapsed))
+        if pipeline is None:
+            controls.tick()
+        frames += 1
+        lap = profiler.lap("step", lap)
+
+        # Episode management (restart from the initial state on game over)
+        if not ram.game_over and bot.started:
+            playing = True
+            score = ram.score
+        elif playing and args.headless:
+            episodes += 1
+            print(f"Episode {episodes}: score {score} ({frames} frames)")
+            game.set_state(start_state)
+            game.step()  # Screen is only valid after stepping a restored state
+            if recorder is not None:
+                recorder.reset()
+            if pipeline is not None:
+                pipeline.drain()
+            controls.clear_buttons()
+            if args.planner:
+                rollouts, reused = rollouts + bot.rollouts, reused + bot.reused
+            bot = new_bot()
+            if pipeline is not None:
+                pipeline.bot = bot
+            playing = False
+
+        lap = profiler.lap("episode", lap)
+
+        # Game FPS management
+        if not args.headless:
+            elapsed = time.perf_counter() - start_time
+            time.sleep(max(0, 1/args.fps - elapsed))
+            profiler.lap("sleep", lap)
+        profiler.end_frame()
+
+        if args.max_frames is not None and frames >= args.max_frames:
+            break
+        if args.max_episodes is not None and episodes >= args.max_episodes:
+            break
+
+    total_time = time.perf_counter() - run_start
+    print(f"Final score: {score}")
+    print(f"Frames: {frames}, Episodes: {episodes}, FPS: {frames / total_time:.1f}")
+
+    if args.planner:
+        rollouts, reused = rollouts + bot.rollouts, reused + bot.reused
+        print(f"Planner: {reused} of {rollouts} rollouts continued from the cache")
+    if pipeline is not None:
+        pipeline.stop()
+        print(f"Pipeline: latency {pipeline.latency} frames, "
+              f"{pipeline.misses} decisions late ({pipeline.misses / max(frames, 1):.1%} of frames)")
 
+    if profiling:
+        profiler.print_summary(deadline=1 / args.fps)
+        if pipeline is not None:
+            print("Bot thread:")
+            bot_profiler.print_summary()
+    if args.profile_trace is not None:
+        profiler.write_trace(args.profile_trace)
 
-    cv2.destroyAllWindows()
+    if renderer is not None:
+        renderer.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,288 @@
+import cv2
+import numpy as np
+
+from config import DEFAULT_CONFIG
+
+# Coordinate system
+#
+# Perception runs on the raw 160x210 RGB buffer returned by game.get_screen(), restricted
+# to the region of interest below. Every position handed to the bot (element positions,
+# widths, passings, player movement probes) is expressed in display coordinates: the ROI
+# scaled SCALE times, with the origin at its top-left corner. A native ROI pixel
+# (col, row) covers the display pixels [SCALE * col, SCALE * col + SCALE) on each axis.
+# Display coordinates are what the debug windows show, so overlays need no conversion.
+SCALE = 3
+ROI_TOP, ROI_BOTTOM = 2, 162  # Native rows analyzed
+ROI_LEFT, ROI_RIGHT = 8, 160  # Native columns analyzed
+ROI_WIDTH = (ROI_RIGHT - ROI_LEFT) * SCALE  # 456 display pixels
+ROI_HEIGHT = (ROI_BOTTOM - ROI_TOP) * SCALE  # 480 display pixels
+
+# Window shown by main.py, in display pixels of the whole scaled screen
+DISPLAY_TOP, DISPLAY_BOTTOM = ROI_TOP * SCALE, 602
+DISPLAY_LEFT, DISPLAY_RIGHT = ROI_LEFT * SCALE, ROI_RIGHT * SCALE
+
+# Entity labels of the label image, entities first so they form a contiguous range
+BACKGROUND = 0
+PLAYER, HELICOPTER, PLANE, BOAT, FUEL, BRIDGE = 1, 2, 3, 4, 5, 6
+RIVER, BANK, ROAD = 7, 8, 9
+LABEL_NAMES = [
+    "Background", "Player", "Helicopter", "Plane", "Boat", "Fuel", "Bridge", "River", "Bank", "Road"
+]
+
+
+def label_colors(config):
+    # Fallback classification by HSV range (see config.py), earlier entries win on overlaps
+    return (
+        (PLAYER, config.player_color),
+        (HELICOPTER, config.helicopter_color),
+        (PLANE, config.plane_color),
+        (BOAT, config.boat_color),
+        (FUEL, config.fuel_color),
+        (BRIDGE, config.bridge_color),
+        (RIVER, config.river_color),
+        (BANK, config.bank_color),
+        (ROAD, config.road_color),
+    )
+
+
+# River Raid palette colors (RGB) pinned to a label, the HSV ranges overlap on these
+PALETTE_LABELS = {
+    (232, 232, 74): PLAYER,
+    (0, 64, 48): HELICOPTER,
+    (117, 181, 239): PLANE,
+    (117, 128, 240): PLANE,
+    (163, 57, 21): BOAT,
+    (214, 92, 92): FUEL,
+    (187, 187, 53): BRIDGE,
+    (45, 50, 184): RIVER,
+    (24, 59, 157): RIVER,
+    (0, 0, 148): RIVER,
+    (84, 160, 197): RIVER,
+    (53, 95, 24): BANK,
+    (110, 156, 66): BANK,
+    (158, 208, 101): BANK,
+    (111, 111, 111): ROAD,
+    (170, 170, 170): ROAD,
+    (167, 26, 26): BACKGROUND,  # Crash flash
+    (210, 164, 74): BACKGROUND,  # Missile
+    (105, 105, 15): BACKGROUND,
+    (134, 134, 29): BACKGROUND,
+}
+
+
+def color_keys(rgb, out=None):
+    # Pack colors to 16 bit RGB565, which still tells every palette color apart
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR565, dst=out).view(np.uint16)[..., 0]
+
+
+def build_label_lut(ranges):
+    # Classify every RGB565 color by HSV range, then pin the known palette colors
+    keys = np.arange(1 << 16, dtype=np.uint16).view(np.uint8).reshape(1, -1, 2)
+    colors = cv2.cvtColor(keys, cv2.COLOR_BGR5652RGB)
+    hsv = cv2.cvtColor(colors, cv2.COLOR_RGB2HSV)
+
+    lut = np.full(1 << 16, BACKGROUND, np.uint8)
+    for label, (lower, upper) in reversed(ranges):
+        mask = cv2.inRange(hsv, np.array(lower, np.uint8), np.array(upper, np.uint8))
+        lut[mask.ravel() > 0] = label
+
+    palette = np.array([list(PALETTE_LABELS)], np.uint8)
+    lut[color_keys(palette).ravel()] = list(PALETTE_LABELS.values())
+    return lut
+
+
+LABEL_LUTS = {}  # Color ranges to their table, every config with the same ranges shares it
+
+
+def label_lut(config):
+    colors = label_colors(config)
+    if colors not in LABEL_LUTS:
+        LABEL_LUTS[colors] = build_label_lut(colors)
+    return LABEL_LUTS[colors]
+
+
+def to_display(value):
+    return value * SCALE
+
+
+def to_native(value):
+    return value // SCALE
+
+
+def to_display_box(x, y, w, h):
+    return x * SCALE, y * SCALE, w * SCALE, h * SCALE
+
+
+def get_display_frame(screen, bgr=None, scaled=None):
+    # Upscaling is only needed to show the game, perception never sees this frame. Callers
+    # drawing every frame pass the buffers of the last call back in.
+    frame = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR, dst=bgr)
+    frame = cv2.resize(frame, None, scaled, fx=SCALE, fy=SCALE, interpolation=cv2.INTER_NEAREST)
+    return frame[DISPLAY_TOP:DISPLAY_BOTTOM, DISPLAY_LEFT:DISPLAY_RIGHT]
+
+
+ENTITY_LABELS = np.arange(PLAYER, BRIDGE + 1, dtype=np.uint8)
+
+# Label range of every mask perception hands out, see Perception.mask
+MASK_LABELS = {"River": (RIVER, RIVER), "Outside": (BANK, ROAD)}
+ROI_ROWS = ROI_BOTTOM - ROI_TOP
+ROI_COLS = ROI_RIGHT - ROI_LEFT
+
+
+def label_components(labels, components, stats):
+    # A blob always has a pixel on the top row of its bounding box, read its label there
+    component_labels = np.zeros(len(stats), np.uint8)
+    for index, (x, y, w) in enumerate(stats[1:, :3].tolist(), start=1):
+        row = components[y, x : x + w]
+        component_labels[index] = labels[y, x + (row == index).argmax()]
+    return component_labels
+
+
+class Perception:
+    def __init__(self, config=DEFAULT_CONFIG):
+        self.lut = label_lut(config)
+        self.components = None
+        self.component_labels = None
+        self.masks = {}  # Masks requested this frame, by name and rows
+
+        # Work buffers, every frame reuses them. The labels and masks handed out are only
+        # valid until the next update.
+        self.keys = np.zeros((ROI_ROWS, ROI_COLS, 2), np.uint8)
+        self.indices = np.zeros((ROI_ROWS, ROI_COLS), np.intp)  # take() copies other index types
+        self.labels = np.zeros((ROI_ROWS, ROI_COLS), np.uint8)
+        self.entity_mask = np.zeros((ROI_ROWS, ROI_COLS), np.uint8)
+        self.component_map = np.zeros((ROI_ROWS, ROI_COLS), np.int32)
+        self.histogram = np.zeros((len(LABEL_NAMES), 1), np.float32)
+        self.mask_buffers = {name: np.zeros((ROI_ROWS, ROI_COLS), np.uint8) for name in MASK_LABELS}
+
+        # Every entity label gets its own band, separated by an empty row, for the frames
+        # where blobs of different classes touch (the player flying over a fuel depot)
+        self.bands = np.zeros((len(ENTITY_LABELS), ROI_ROWS + 1, ROI_COLS), np.uint8)
+        self.band_map = np.zeros((len(ENTITY_LABELS) * (ROI_ROWS + 1), ROI_COLS), np.int32)
+
+    def update(self, screen):
+        # Label every pixel with a single table lookup of its color
+        roi = screen[ROI_TOP:ROI_BOTTOM, ROI_LEFT:ROI_RIGHT]
+        np.copyto(self.indices, color_keys(roi, self.keys))
+        self.lut.take(self.indices, out=self.labels, mode="clip")  # "raise" buffers out
+
+        # One connected components pass over all entities
+        cv2.inRange(self.labels, PLAYER, BRIDGE, self.entity_mask)
+        _, components, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            self.entity_mask, 8, cv2.CV_32S, cv2.CCL_BBDT, self.component_map
+        )
+        self.segment(stats, label_components(self.labels, components, stats))
+
+    def segment(self, stats, component_labels):
+        # Keep the blobs found in the labels of this frame, unless some mix classes: those hold
+        # more pixels than their label has, separate them then
+        histogram = cv2.calcHist(
+            [self.labels], [0], None, [len(LABEL_NAMES)], [0, len(LABEL_NAMES)], self.histogram
+        )
+        areas = np.bincount(
+            component_labels[1:], stats[1:, cv2.CC_STAT_AREA], minlength=len(LABEL_NAMES)
+        )
+        if not np.array_equal(areas[PLAYER : BRIDGE + 1], histogram[PLAYER : BRIDGE + 1, 0]):
+            stats, component_labels = self.label_bands()
+
+        self.components = stats
+        self.component_labels = component_labels
+        self.masks = {}
+
+    def mask(self, name, top=0, bottom=ROI_ROWS):
+        # Rows [top, bottom) of a mask, computed on the first request of the frame. Consumers
+        # ask for the rows they read only, so unused masks and rows cost nothing. A band of a
+        # mask built whole already is a view of it.
+        key = (name, top, bottom)
+        mask = self.masks.get(key)
+        if mask is None:
+            whole = self.masks.get((name, 0, ROI_ROWS))
+            if whole is not None:
+                mask = whole[top:bottom]
+            else:
+                lower, upper = MASK_LABELS[name]
+                mask = cv2.inRange(
+                    self.labels[top:bottom], lower, upper, self.mask_buffers[name][top:bottom]
+                )
+            self.masks[key] = mask
+        return mask
+
+    def probe(self, name, row, col):
+        # Single pixel of a mask, read from the labels without building the mask
+        lower, upper = MASK_LABELS[name]
+        return lower <= self.labels[row, col] <= upper
+
+    def label_bands(self):
+        np.equal(
+            self.labels, ENTITY_LABELS[:, None, None], out=self.bands[:, :ROI_ROWS].view(bool)
+        )
+        _, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            self.bands.reshape(-1, ROI_COLS), 8, cv2.CV_32S, cv2.CCL_BBDT, self.band_map
+        )
+        band, stats[:, cv2.CC_STAT_TOP] = np.divmod(stats[:, cv2.CC_STAT_TOP], ROI_ROWS + 1)
+        component_labels = ENTITY_LABELS[band]
+        component_labels[0] = BACKGROUND
+        return stats, component_labels
+
+    def entities(self, label=None, top=0):
+        # Yield (label, x, y, w, h, area) for every detected blob reaching below row top, in
+        # native ROI pixels
+        for index in range(1, len(self.components)):
+            if label is None or self.component_labels[index] == label:
+                x, y, w, h, area = self.components[index].tolist()
+                if y + h > top:
+                    yield int(self.component_labels[index]), x, y, w, h, area
+
+
+# Rows of every game in a batch. The labeling scans blocks of two rows, an even stride scans
+# every game like a lone frame.
+GAME_ROWS = ROI_ROWS + 2
+
+
+class BatchPerception:
+    # Perception of many games' screens at once, for the bots of parallel games living in one
+    # process. The screens are stacked into one image with empty rows after every game, so
+    # a single color conversion, lookup and connected components pass covers all of them;
+    # every game then gets the labels and blobs of its rows in its own Perception, which
+    # detects and masks exactly as after Perception.update. All games share the color ranges
+    # of config.
+    def __init__(self, count, config=DEFAULT_CONFIG):
+        self.lut = label_lut(config)
+        self.perceptions = [Perception(config) for _ in range(count)]
+
+        # Work buffers, every batch reuses them. Separator rows keep a background color key.
+        rows = count * GAME_ROWS
+        self.rois = np.zeros((count, ROI_ROWS, ROI_COLS, 3), np.uint8)
+        self.keys = np.zeros((count * ROI_ROWS, ROI_COLS, 2), np.uint8)
+        self.indices = np.full(
+            (count, GAME_ROWS, ROI_COLS), np.argmax(self.lut == BACKGROUND), np.intp
+        )
+        self.labels = np.zeros((count, GAME_ROWS, ROI_COLS), np.uint8)
+        self.entity_mask = np.zeros((rows, ROI_COLS), np.uint8)
+        self.component_map = np.zeros((rows, ROI_COLS), np.int32)
+
+    def update(self, screens):
+        # screens is a (count, height, width, 3) stack of raw screens, game i gets screens[i]
+        np.copyto(self.rois, screens[:, ROI_TOP:ROI_BOTTOM, ROI_LEFT:ROI_RIGHT])
+        keys = color_keys(self.rois.reshape(-1, ROI_COLS, 3), self.keys)
+        np.copyto(self.indices[:, :ROI_ROWS], keys.reshape(-1, ROI_ROWS, ROI_COLS))
+        self.lut.take(self.indices, out=self.labels, mode="clip")
+
+        labels = self.labels.reshape(-1, ROI_COLS)
+        cv2.inRange(labels, PLAYER, BRIDGE, self.entity_mask)
+        _, components, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            self.entity_mask, 8, cv2.CV_32S, cv2.CCL_BBDT, self.component_map
+        )
+        component_labels = label_components(labels, components, stats)
+
+        # Blobs are numbered in scan order, so every game's blobs are a contiguous run, in the
+        # order a lone frame has them
+        games, stats[:, cv2.CC_STAT_TOP] = np.divmod(stats[:, cv2.CC_STAT_TOP], GAME_ROWS)
+        bounds = np.searchsorted(games[1:], np.arange(len(self.perceptions) + 1)) + 1
+        for game, perception in enumerate(self.perceptions):
+            start, stop = bounds[game], bounds[game + 1]
+            np.copyto(perception.labels, self.labels[game, :ROI_ROWS])
+            perception.segment(
+                np.concatenate([stats[:1], stats[start:stop]]),
+                np.concatenate([component_labels[:1], component_labels[start:stop]]),
+            )
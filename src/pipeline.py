@@ -0,0 +1,74 @@
+import threading
+from queue import Queue
+
+import numpy as np
+
+from controls import BUTTON_COUNT
+
+IDLE_MASK = [0] * BUTTON_COUNT  # Played while the first decisions are still in flight
+
+
+class Pipeline(threading.Thread):
+    # Runs perception and Bot.action on their own thread while the control loop steps the
+    # emulator. The decision made from frame N is played at frame N + latency, so with a
+    # latency of one frame the emulator steps frame N while the bot looks at it; OpenCV and the
+    # emulator core both release the GIL for their work. Screens are copied into a ring of
+    # latency + 1 preallocated buffers (two, double buffering, at the default latency): the
+    # control loop only writes a buffer again once the decision made from it was played.
+    #
+    # The control loop waits for a decision that is not ready when it is due, which keeps
+    # runs reproducible for a given latency; every such wait is counted as a deadline miss.
+    def __init__(self, bot, controls, screen_shape, latency=1, snapshots=False):
+        super().__init__(daemon=True)
+        self.bot = bot
+        self.controls = controls  # Owned by this thread while frames are in flight
+        self.latency = latency
+        self.snapshots = snapshots
+        self.buffers = np.zeros((latency + 1, *screen_shape), np.uint8)
+        self.inputs = Queue()
+        self.results = Queue()
+        self.submitted = 0
+        self.played = 0
+        self.misses = 0
+
+    def submit(self, screen, key):
+        buffer = self.buffers[self.submitted % len(self.buffers)]
+        np.copyto(buffer, screen)
+        self.inputs.put((buffer, key))
+        self.submitted += 1
+
+    def decision(self):
+        # Buttons and bot snapshot decided latency frames ago, None while the pipeline fills
+        if self.submitted - self.played <= self.latency:
+            return None
+        if self.results.empty():
+            self.misses += 1
+        self.played += 1
+        return self.results.get()
+
+    def drain(self):
+        # Wait for the frames in flight and drop their decisions, the bot thread is idle after
+        while self.played < self.submitted:
+            self.results.get()
+            self.played += 1
+
+    def stop(self):
+        self.inputs.put(None)
+        self.join()
+
+    def run(self):
+        controls = self.controls
+        while True:
+            frame = self.inputs.get()
+            if frame is None:
+                break
+            screen, key = frame
+            bot = self.bot
+            bot.refresh(screen)
+            controls.update_inputs()
+            controls.process_key(key)
+            buttons = list(controls.buttons)
+            snapshot = bot.snapshot() if self.snapshots else None
+            controls.tick()
+            bot.profiler.end_frame()
+            self.results.put((buttons, snapshot))
@@ -0,0 +1,142 @@
+from time import perf_counter
+
+from bot import Bot
+from environment import ACTIONS, ACTION_MASKS
+from library import canonical
+
+SEGMENT_FRAMES = 4  # Frames between plans, and that an overriding plan is held for
+HORIZON_FRAMES = 24  # Frames every candidate is emulated ahead
+TIME_BUDGET = 0.2  # Seconds a decision may take, candidates left when it runs out are skipped
+CRASH_PENALTY = 10000  # Value of crashing, plus the frames flown before it
+FUEL_WEIGHT = 1  # Value of one unit of the fuel gauge (255 is a full tank)
+
+
+class Rollout:
+    __slots__ = ("checkpoints", "state", "frames", "score", "fuel", "crashed")
+
+    def __init__(self, checkpoints, state, frames, score, fuel, crashed):
+        self.checkpoints = checkpoints  # States every SEGMENT_FRAMES along the rollout
+        self.state = state  # State it ended in
+        self.frames = frames  # Frames emulated since the decision
+        self.score = score
+        self.fuel = fuel
+        self.crashed = crashed
+
+    def advance(self):
+        # The same rollout seen from its first checkpoint, where the game is one decision later
+        return Rollout(
+            self.checkpoints[1:],
+            self.state,
+            self.frames - SEGMENT_FRAMES,
+            self.score,
+            self.fuel,
+            self.crashed,
+        )
+
+
+class PlannerBot(Bot):
+    # Checks the rules' decision by emulating it ahead, and overrides it when it crashes.
+    # Every plan saves the emulator state in memory, holds the candidate button masks for
+    # HORIZON_FRAMES from it, scores the outcomes from the RAM and restores the state. The
+    # rules come first; when they crash, the best other candidate found within the time
+    # budget is played instead.
+    #
+    # The emulator is deterministic, so the state SEGMENT_FRAMES into a candidate's rollout
+    # is exactly the game's next decision state if that candidate is played. Rollouts are
+    # cached under those states: at the next decision they are only extended by the frames
+    # that became visible, and candidates already known to crash are not emulated again.
+    # States are keyed in canonical form, the raw bytes of identical games can differ.
+    def __init__(self, controls, game, budget=TIME_BUDGET, **options):
+        super().__init__(controls, **options)
+        self.game = game  # Its game_ram scores the rollouts
+        self.budget = budget
+        self.cache = {}  # Decision state to the rollouts reaching it, by button mask
+        self.next_plan = 0
+        self.overridden = False
+        self.rollouts = 0  # Candidates evaluated
+        self.reused = 0  # Of which continued from a cached rollout
+
+    def action(self):
+        starting = not self.started
+        super().action()
+        self.overridden = False
+        if starting or self.frame_count < self.next_plan:
+            return  # The rules decide alone between plans, and the start press is left alone
+        self.next_plan = self.frame_count + SEGMENT_FRAMES
+
+        deadline = perf_counter() + self.budget
+        controls, game, ram = self.controls, self.game, self.game_ram
+        state = canonical(game.get_state())
+        cached = self.cache.pop(state, {})
+        self.cache = {}
+        score, fuel = ram.score, ram.fuel
+
+        # Buttons the rules pressed for this decision, the ones released now are not part of it
+        rules = tuple(
+            int(button == 1 and release > controls.frame)
+            for button, release in zip(controls.buttons, controls.release)
+        )
+        candidates = [rules] + [tuple(mask) for mask in ACTION_MASKS if tuple(mask) != rules]
+
+        best = None
+        best_value = None
+        emulated = False  # The emulator is still at the decision state until a rollout runs
+        for mask in candidates:
+            if best is not None and perf_counter() > deadline:
+                break
+            rollout = cached.get(mask)
+            self.rollouts += 1
+            self.reused += rollout is not None
+            if rollout is None or not rollout.crashed:
+                rollout = self.rollout(state, mask, rollout, restore=emulated)
+                emulated = True
+            if rollout.checkpoints:
+                self.cache.setdefault(rollout.checkpoints[0], {})[mask] = rollout.advance()
+
+            if rollout.crashed:
+                value = rollout.frames - CRASH_PENALTY
+            else:
+                value = rollout.score - score + FUEL_WEIGHT * (rollout.fuel - fuel)
+            if best_value is None or value > best_value:
+                best, best_value = mask, value
+            if mask == rules and not rollout.crashed:
+                break  # Only crashes are overridden, shooting fuel depots also scores
+
+        if emulated:
+            game.set_state(state)
+        if best != rules:
+            self.overridden = True
+            controls.clear_buttons()
+            action = ACTION_MASKS.index(list(best))
+            controls.input_commands(ACTIONS[action])
+            self.targets["Plan"] = " + ".join(command.name for command in ACTIONS[action]) or "NONE"
+        self.targets["Plan Value"] = best_value
+
+    def rollout(self, state, mask, cached=None, restore=True):
+        # Hold the candidate's mask until the horizon or a crash, continuing a cached rollout.
+        # Restoring a state is by far the slowest part, skip it when the game is there already.
+        game, ram = self.game, self.game_ram
+        if cached is not None:
+            game.set_state(cached.state)
+            checkpoints = list(cached.checkpoints)
+            frames = cached.frames
+        else:
+            if restore:
+                game.set_state(state)
+            checkpoints = []
+            frames = 0
+
+        game.set_button_mask(list(mask))
+        crashed = False
+        while frames < HORIZON_FRAMES:
+            game.step()
+            frames += 1
+            if ram.crashed:
+                crashed = True
+                break
+            if frames % SEGMENT_FRAMES == 0:
+                checkpoints.append(canonical(game.get_state()))
+        return Rollout(checkpoints, game.get_state(), frames, ram.score, ram.fuel, crashed)
+
+    def decision_interval(self):
+        return SEGMENT_FRAMES if self.overridden else super().decision_interval()
@@ -0,0 +1,84 @@
+import csv
+import json
+from array import array
+from time import perf_counter
+
+import numpy as np
+
+PERCENTILES = [50, 95, 99]
+IDLE_STAGES = ["sleep"]  # Time spent waiting, not counted against the frame deadline
+
+
+class Profiler:
+    # Per-frame durations of every stage, in seconds. Stages are timed with lap(), which costs
+    # one perf_counter() call, and stored in flat arrays so it can stay on for long runs.
+    def __init__(self):
+        self.columns = {}  # Stage name to one duration per frame
+        self.current = {}
+        self.frames = 0
+
+    def lap(self, stage, start):
+        # Add the time since start to the stage, return the time the next stage starts at
+        now = perf_counter()
+        self.current[stage] = self.current.get(stage, 0.0) + now - start
+        return now
+
+    def end_frame(self):
+        for stage in self.current:
+            if stage not in self.columns:
+                self.columns[stage] = array("d", bytes(8 * self.frames))
+        for stage, column in self.columns.items():
+            column.append(self.current.get(stage, 0.0))
+        self.current.clear()
+        self.frames += 1
+
+    def durations(self):
+        # Stage columns plus the busy time of every frame, in milliseconds
+        durations = {stage: np.frombuffer(column) * 1000 for stage, column in self.columns.items()}
+        busy = [values for stage, values in durations.items() if stage not in IDLE_STAGES]
+        durations["busy"] = np.sum(busy, axis=0) if busy else np.zeros(self.frames)
+        return durations
+
+    def summary(self, deadline=None):
+        summary = {"frames": self.frames, "stages": {}}
+        if self.frames == 0:
+            return summary
+        for stage, values in self.durations().items():
+            summary["stages"][stage] = {
+                "mean": float(values.mean()),
+                **{f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES},
+                "max": float(values.max()),
+            }
+            if stage == "busy" and deadline is not None:
+                summary["missed_deadlines"] = int(np.count_nonzero(values > deadline * 1000))
+        return summary
+
+    def print_summary(self, deadline=None):
+        summary = self.summary(deadline)
+        print(f"Profile over {summary['frames']} frames (ms):")
+        for stage, stats in summary["stages"].items():
+            percentiles = ", ".join(f"p{p} {stats[f'p{p}']:.3f}" for p in PERCENTILES)
+            print(f"  {stage:<15} mean {stats['mean']:.3f}, {percentiles}, max {stats['max']:.3f}")
+        if "missed_deadlines" in summary:
+            print(f"  Missed {1 / deadline:.0f} FPS deadlines: {summary['missed_deadlines']}")
+
+    def write_trace(self, path):
+        # One row per frame with every stage in milliseconds, JSON or CSV by file extension
+        durations = {stage: values.tolist() for stage, values in self.durations().items()}
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump(durations, f)
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", *durations])
+            writer.writerows(zip(range(self.frames), *durations.values()))
+
+
+class NullProfiler:
+    # Stand-in when profiling is off, keeps the timed code free of checks
+    def lap(self, stage, start):
+        return start
+
+    def end_frame(self):
+        pass
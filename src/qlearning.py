@@ -0,0 +1,207 @@
+import os
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from bot import Bot
+from environment import ACTIONS, RiverRaidEnv
+from workers import add_start_arguments, worker
+
+# Discretized state: bin of the horizontal distance (display pixels) from the player to the
+# nearest enemy, fuel depot and passing center, plus whether it can move left and right.
+# The last bin of every distance means there is nothing of that kind on screen.
+X_BINS = [-90, -45, -15, -5, 5, 15, 45, 90]
+NONE_BIN = len(X_BINS) + 1
+STATE_SHAPE = (NONE_BIN + 1, NONE_BIN + 1, NONE_BIN + 1, 2, 2)
+STATES = int(np.prod(STATE_SHAPE))
+
+# The table file holds the action values and how often each one was updated
+VALUES, VISITS = 0, 1
+
+LEARNING_RATE = 0.1
+DISCOUNT = 0.99
+EPSILON_START = 1.0
+EPSILON_END = 0.05
+EPSILON_DECAY = 0.8  # Exploration kept after every training round
+
+
+def x_bin(player, elements):
+    # Bin of the nearest element by vertical distance, the closest one reaches the player first
+    if not elements:
+        return NONE_BIN
+    nearest = min(elements, key=lambda element: abs(player.y_diff(element)))
+    return int(np.digitize(player.x_diff(nearest), X_BINS))
+
+
+def discretize(bot):
+    player = bot.player
+    passing = min(bot.passings, key=lambda p: abs(player.x_diff(p)), default=None)
+    return int(np.ravel_multi_index(
+        (
+            x_bin(player, bot.enemies),
+            x_bin(player, bot.fuels),
+            NONE_BIN if passing is None else int(np.digitize(player.x_diff(passing), X_BINS)),
+            int(player.can_move_left),
+            int(player.can_move_right),
+        ),
+        STATE_SHAPE,
+    ))
+
+
+def open_table(path):
+    # Memory-mapped so training resumes, and bots start, without reading the whole file
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r+")
+    return np.lib.format.open_memmap(path, "w+", np.float32, (2, STATES, len(ACTIONS)))
+
+
+class QBot(Bot):
+    # Plays the greedy action of a trained Q-table through the same commands as the training
+    # environment, holding each one for frame_skip frames like the environment repeats them
+    def __init__(self, controls, table, frame_skip=4, **options):
+        super().__init__(controls, frame_skip=frame_skip, **options)
+        self.values = table[VALUES]
+
+    def action(self):
+        if not self.start_game():
+            return
+        action = int(np.argmax(self.values[discretize(self)]))
+        self.controls.input_commands(ACTIONS[action])
+        self.targets = {"Action": " + ".join(command.name for command in ACTIONS[action]) or "None"}
+
+    def decision_interval(self):
+        return self.frame_skip if self.started else 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="River Raid tabular Q-learning training")
+    add_start_arguments(parser)
+    parser.add_argument(
+        "--table", type=str, default="qtable.npy",
+        help="Q-table file, created if missing and resumed otherwise (default: qtable.npy)"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=10,
+        help="Training rounds, the workers' updates are merged after each one"
+    )
+    parser.add_argument(
+        "--episodes", type=int, default=2,
+        help="Episodes every worker plays per round"
+    )
+    parser.add_argument(
+        "--epsilon", type=float, default=EPSILON_START,
+        help="Exploration rate of the first round, lower it when resuming (default: 1.0)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=multiprocessing.cpu_count(),
+        help="Number of worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--max-frames", type=int, default=5000,
+        help="Frame limit per episode"
+    )
+    parser.add_argument(
+        "--perception", choices=["vision", "ram"], default="vision",
+        help="Read entities from the screen (vision) or from the game RAM (default: vision)"
+    )
+    parser.add_argument(
+        "--frame-skip", type=int, default=4,
+        help="Emulator frames every action is repeated for (default: 4)"
+    )
+    return parser.parse_args()
+
+
+def init_worker(rom, state, perception, frame_skip, max_frames, library, section, min_difficulty):
+    worker["env"] = RiverRaidEnv(
+        rom=rom,
+        state=state,
+        perception=perception,
+        frame_skip=frame_skip,
+        max_frames=max_frames,
+        library=library,
+        section=section,
+        min_difficulty=min_difficulty,
+    )
+
+
+def train_episodes(task):
+    # Epsilon-greedy Q-learning on a private copy of the table, returns the copy, the updates
+    # made to every cell and the episode scores
+    path, seed, episodes, epsilon = task
+    env = worker["env"]
+    values = np.array(np.load(path, mmap_mode="r")[VALUES])
+    visits = np.zeros_like(values)
+    rng = np.random.default_rng(seed)
+
+    scores = []
+    for episode in range(episodes):
+        env.reset(seed=seed + episode)
+        state = discretize(env.bot)
+        done = False
+        while not done:
+            if rng.random() < epsilon:
+                action = int(rng.integers(len(ACTIONS)))
+            else:
+                action = int(np.argmax(values[state]))
+            _, reward, terminated, truncated, info = env.step(action)
+            next_state = discretize(env.bot)
+            target = reward if terminated else reward + DISCOUNT * values[next_state].max()
+            values[state, action] += LEARNING_RATE * (target - values[state, action])
+            visits[state, action] += 1
+            state = next_state
+            done = terminated or truncated
+        scores.append(info["score"])
+    return values, visits, scores
+
+
+def merge(table, results):
+    # Every cell becomes the average of the workers' values, weighted by their updates
+    visits = sum(result[1] for result in results)
+    weighted = sum(result[0] * result[1] for result in results)
+    updated = visits > 0
+    values = table[VALUES]
+    values[updated] = weighted[updated] / visits[updated]
+    table[VISITS] += visits
+    table.flush()
+
+
+def main():
+    args = parse_args()
+    table = open_table(args.table)
+    resumed = table[VISITS].sum() > 0
+    print(f"Q-table {args.table}: {STATES} states, {len(ACTIONS)} actions"
+          + (", resumed" if resumed else ""))
+
+    epsilon = args.epsilon
+    with multiprocessing.Pool(
+        args.workers,
+        initializer=init_worker,
+        initargs=(
+            args.rom, args.state, args.perception, args.frame_skip, args.max_frames,
+            args.library, args.section, args.min_difficulty,
+        ),
+    ) as pool:
+        for index in range(args.rounds):
+            start_time = time.perf_counter()
+            seed = int(table[VISITS].sum())  # Fresh episodes when resuming
+            tasks = [
+                (args.table, seed + n * args.episodes, args.episodes, epsilon)
+                for n in range(args.workers)
+            ]
+            results = pool.map(train_episodes, tasks)
+            merge(table, results)
+
+            scores = [score for result in results for score in result[2]]
+            print(
+                f"Round {index + 1}/{args.rounds}: epsilon {epsilon:.2f}, "
+                f"score mean {np.mean(scores):.1f}, max {max(scores)}, "
+                f"{np.count_nonzero(table[VISITS].sum(axis=1))}/{STATES} states visited "
+                f"({time.perf_counter() - start_time:.1f}s)"
+            )
+            epsilon = max(EPSILON_END, epsilon * EPSILON_DECAY)
+
+
+if __name__ == "__main__":
+    main()
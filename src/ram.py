@@ -0,0 +1,120 @@
+import retro
+
+from perception import PLANE, HELICOPTER, BOAT, BRIDGE, ROI_ROWS
+from perception import FUEL as FUEL_DEPOT  # FUEL is the gauge address here
+
+# The Atari 2600 exposes its 128 bytes of RAM at addresses 0x80-0xFF
+RAM_START = 0x80
+
+# Addresses taken from the stable-retro Riverraid-Atari2600 integration
+LIVES = 0xC0
+SCORE_DIGITS = [0xD7, 0xD5, 0xD3, 0xD1, 0xCF, 0xCD]  # Units to hundred thousands
+
+# Fuel gauge: 255 is a full tank, 0 is empty
+FUEL = 0xB7
+FUEL_EMPTY = 0
+FUEL_FULL = 255
+
+# Player horizontal position, the sprite center is 4 pixels left of it (native ROI columns)
+PLAYER_X = 0xB3
+PLAYER_X_OFFSET = -4
+
+# Player sprite pointer: the plane (straight or banking), the explosion, 0 before launch
+PLAYER_SPRITE = 0xBA
+EXPLOSION_SPRITE = 223
+
+# The river is drawn in 32 row blocks holding at most one object each. Slot 0 is the
+# lowest block on screen, the blocks move down by the fine scroll value every frame.
+SCROLL = 0x8B
+OBJECT_SLOTS = 6
+OBJECT_TYPES = 0xA0  # One byte per slot
+OBJECT_COARSE_X = 0x94  # 15 pixel steps
+OBJECT_FINE_X = 0x9A  # Signed high nibble, moves the object left
+BLOCK_HEIGHT = 32
+COARSE_STEP = 15
+BOTTOM_BLOCK = 4  # Block of slot 0, counting from the top of the ROI
+
+# Object type codes and the offset of their sprite center within a block (native pixels).
+# Other codes are empty slots, explosions and houses on the banks.
+OBJECT_LABELS = {4: PLANE, 5: HELICOPTER, 6: HELICOPTER, 7: BOAT, 8: BRIDGE, 10: FUEL_DEPOT}
+OBJECT_OFFSETS = {
+    PLANE: (3, 17),
+    HELICOPTER: (3, 18),
+    BOAT: (7, 22),
+    BRIDGE: (15, 20),
+    FUEL_DEPOT: (1, 16),
+}
+
+# Digits are stored as offsets into the font table (8 bytes per glyph), blank is 10
+DIGIT_HEIGHT = 8
+BLANK_DIGIT = 10
+
+
+def read_digit(value):
+    digit = value // DIGIT_HEIGHT
+    return None if digit >= BLANK_DIGIT else digit
+
+
+def read_fine_x(value):
+    nibble = value >> 4
+    return nibble - 16 if nibble >= 8 else nibble
+
+
+class GameRAM:
+    def __init__(self, game):
+        self.data = retro.data.GameData()
+        game.configure_data(self.data)
+
+    def read(self):
+        return self.data.memory.blocks[RAM_START]
+
+    def __getitem__(self, address):
+        return self.read()[address - RAM_START]
+
+    @property
+    def score(self):
+        ram = self.read()
+        score = 0
+        for power, address in enumerate(SCORE_DIGITS):
+            digit = read_digit(ram[address - RAM_START])
+            if digit is not None:
+                score += digit * 10**power
+        return score
+
+    @property
+    def fuel(self):
+        return self[FUEL]
+
+    @property
+    def lives(self):
+        return read_digit(self[LIVES])
+
+    @property
+    def game_over(self):
+        # The lives counter is blanked before the game starts and after the last life
+        return self.lives is None
+
+    @property
+    def crashed(self):
+        # Set from the frame the plane hits something until the next one is launched
+        return self[PLAYER_SPRITE] == EXPLOSION_SPRITE
+
+    @property
+    def player_x(self):
+        return self[PLAYER_X] + PLAYER_X_OFFSET
+
+    def objects(self):
+        # Yield (label, x, y) of the object in every occupied slot, centers in native ROI pixels
+        ram = self.read()
+        scroll = ram[SCROLL - RAM_START]
+        for slot in range(OBJECT_SLOTS):
+            label = OBJECT_LABELS.get(ram[OBJECT_TYPES + slot - RAM_START])
+            if label is None:
+                continue
+            offset_x, offset_y = OBJECT_OFFSETS[label]
+            coarse = ram[OBJECT_COARSE_X + slot - RAM_START]
+            fine = read_fine_x(ram[OBJECT_FINE_X + slot - RAM_START])
+            x = COARSE_STEP * coarse - fine + offset_x
+            y = BLOCK_HEIGHT * (BOTTOM_BLOCK - slot) + scroll + offset_y
+            if 0 <= y < ROI_ROWS:
+                yield label, x, y
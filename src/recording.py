@@ -0,0 +1,167 @@
+import struct
+import argparse
+import time
+from array import array
+
+import numpy as np
+import retro
+
+from ram import GameRAM
+
+# Input log: magic, starting state (uint32 length + bytes), then one uint16 button mask per
+# frame with bit i holding button i. RESET marks the start state being restored mid-log.
+MAGIC = b"RRINPUT1"
+RESET = 0xFFFF
+FLUSH_FRAMES = 600  # Masks buffered before they are written, a crash loses at most these
+
+# The frame file header is written for a huge frame count first and rewritten with the real
+# one on close, padded to the same length so the frames never move
+HEADER_FRAMES = 10**12
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="River Raid input log replay")
+    parser.add_argument("log", type=str, help="Input log recorded with main.py --record")
+    parser.add_argument(
+        "--rom", type=str, default="river-raid.a26",
+        help="Path to the game ROM file (default: river-raid.a26)"
+    )
+    parser.add_argument(
+        "--frames", type=str,
+        help="Extract every replayed screen to this memory-mapped .npy file"
+    )
+    return parser.parse_args()
+
+
+def pack_buttons(buttons):
+    mask = 0
+    for bit, pressed in enumerate(buttons):
+        if pressed:
+            mask |= 1 << bit
+    return mask
+
+
+def unpack_buttons(mask, count=9):
+    return [(mask >> bit) & 1 for bit in range(count)]
+
+
+def npy_header(frames, shape, length=None):
+    # .npy version 1.0 header, space padded to length (or to the usual 64 byte alignment)
+    header = repr({"descr": "|u1", "fortran_order": False, "shape": (frames, *shape)})
+    prefix = len(np.lib.format.MAGIC_PREFIX) + 2 + 2
+    if length is None:
+        length = -(-(prefix + len(header) + 1) // 64) * 64
+    header = header.ljust(length - prefix - 1) + "\n"
+    return np.lib.format.magic(1, 0) + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+class FrameWriter:
+    # Appends screens to a .npy file that np.load(path, mmap_mode="r") maps without copying
+    def __init__(self, path, shape):
+        self.file = open(path, "wb")
+        self.shape = tuple(shape)
+        self.header_length = len(npy_header(HEADER_FRAMES, self.shape))
+        self.file.write(npy_header(HEADER_FRAMES, self.shape))
+        self.frames = 0
+
+    def write(self, screen):
+        self.file.write(np.ascontiguousarray(screen).data)
+        self.frames += 1
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(npy_header(self.frames, self.shape, self.header_length))
+        self.file.close()
+
+
+class InputRecorder:
+    def __init__(self, path, state, frames_path=None, screen_shape=None):
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<I", len(state)) + state)
+        self.masks = array("H")
+        self.frames = FrameWriter(frames_path, screen_shape) if frames_path else None
+
+    def record(self, buttons, screen=None):
+        # Call with the mask passed to game.set_button_mask, right before game.step()
+        self.masks.append(pack_buttons(buttons))
+        if self.frames is not None:
+            self.frames.write(screen)
+        if len(self.masks) >= FLUSH_FRAMES:
+            self.flush()
+
+    def reset(self):
+        # The start state was restored and stepped once with the last mask
+        self.masks.append(RESET)
+
+    def flush(self):
+        self.file.write(self.masks.tobytes())
+        self.file.flush()
+        self.masks = array("H")
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        if self.frames is not None:
+            self.frames.close()
+
+
+def read_log(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not an input log")
+    (length,) = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    state = data[start : start + length]
+    masks = np.frombuffer(data, "<u2", offset=start + length)
+    return state, masks
+
+
+def logged_frames(masks):
+    return int(np.count_nonzero(masks != RESET))
+
+
+def replay(game, state, masks, screens=None):
+    # Re-run the log without the bot, as fast as the emulator goes, return the frames stepped.
+    # screens, with a row per logged frame, receives every screen when given.
+    game.set_state(state)
+    frames = 0
+    for mask in masks.tolist():
+        if mask == RESET:
+            game.set_state(state)
+            game.step()
+            continue
+        # The screen is only valid after stepping a restored state, the first row is left as is
+        if screens is not None and frames:
+            screens[frames] = game.get_screen()
+        game.set_button_mask(unpack_buttons(mask))
+        game.step()
+        frames += 1
+    return frames
+
+
+def main():
+    args = parse_args()
+    state, masks = read_log(args.log)
+    game = retro.RetroEmulator(args.rom)
+    ram = GameRAM(game)
+
+    screens = None
+    if args.frames is not None:
+        shape = (logged_frames(masks), *game.get_screen().shape)
+        screens = np.lib.format.open_memmap(args.frames, "w+", np.uint8, shape)
+
+    start = time.perf_counter()
+    frames = replay(game, state, masks, screens)
+    if screens is not None:
+        screens.flush()
+    elapsed = time.perf_counter() - start
+
+    print(f"Replayed {frames} frames in {elapsed:.1f}s ({frames / elapsed:.1f} FPS)")
+    print(f"Final score: {ram.score}, lives: {ram.lives}")
+    if args.frames:
+        print(f"Frames written to {args.frames}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from bot import PASSING_Y
+from perception import ROI_HEIGHT, ROI_WIDTH, SCALE, get_display_frame
+
+FRAME_WAIT = 1 / 60  # Longest the window goes without processing GUI events (seconds)
+NO_KEY = 255
+
+
+class Renderer(threading.Thread):
+    # Shows the game and the perception overlays from its own thread. The control loop only
+    # hands over the latest screen and bot snapshot; frames not drawn yet are replaced, so a
+    # slow window drops frames instead of slowing the bot down. All cv2 GUI calls happen here.
+    def __init__(self, overlay=True):
+        super().__init__(daemon=True)
+        self.overlay = overlay
+        self.latest = None
+        self.ready = threading.Condition()
+        self.keys = deque()
+        self.running = True
+        self.dropped = 0
+        self.buffers = None  # Color converted, upscaled and overlay frames, sized on first use
+
+    def submit(self, screen, snapshot):
+        with self.ready:
+            if self.latest is not None:
+                self.dropped += 1
+            self.latest = (screen, snapshot)
+            self.ready.notify()
+
+    def key(self):
+        # Oldest key pressed in a window since the last call, NO_KEY if none
+        return self.keys.popleft() if self.keys else NO_KEY
+
+    def stop(self):
+        with self.ready:
+            self.running = False
+            self.ready.notify()
+        self.join()
+
+    def run(self):
+        while True:
+            with self.ready:
+                self.ready.wait_for(lambda: self.latest is not None or not self.running, FRAME_WAIT)
+                if not self.running:
+                    break
+                frame, self.latest = self.latest, None
+
+            if frame is not None:
+                self.show(*frame)
+            key = cv2.waitKey(1) & 0xFF
+            if key != NO_KEY:
+                self.keys.append(key)
+        cv2.destroyAllWindows()
+
+    def show(self, screen, snapshot):
+        if self.buffers is None:
+            height, width = screen.shape[0] * SCALE, screen.shape[1] * SCALE
+            self.buffers = (
+                np.empty_like(screen),
+                np.empty((height, width, 3), np.uint8),
+                np.empty((ROI_HEIGHT, ROI_WIDTH, 3), np.uint8),
+            )
+        bgr, scaled, roi = self.buffers
+        frame = get_display_frame(screen, bgr, scaled)
+        cv2.imshow("River Raid", frame)
+        if self.overlay:
+            np.copyto(roi, frame[:ROI_HEIGHT])
+            draw_overlay(roi, snapshot)
+            cv2.imshow("Detected Objects", roi)
+
+
+def draw_overlay(frame, snapshot):
+    # Everything is in display coordinates already (see perception.py)
+    for name, x, y, left, right in snapshot["objects"]:
+        cv2.putText(frame, name, (x, y - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+        cv2.circle(frame, [x, y], radius=2, color=(0, 255, 0), thickness=-1)
+        cv2.line(frame, [left, y], [right, y], color=(255, 0, 255), thickness=2)
+
+    if snapshot["player"] is not None:
+        x, y, left, right = snapshot["player"]
+        cv2.circle(frame, [x, y], radius=1, color=(0, 255, 0), thickness=1)
+        cv2.line(frame, [left, y], [right, y], color=(255, 0, 255), thickness=2)
+
+    for left, right in snapshot["passings"]:
+        cv2.line(frame, [left, PASSING_Y], [right, PASSING_Y], color=(0, 255, 255), thickness=1)
+
+    # Decision of the frame, one reason per line
+    for line, (reason, target) in enumerate(snapshot["targets"].items()):
+        cv2.putText(
+            frame,
+            f"{reason}: {target}",
+            (4, 12 + 12 * line),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.35,
+            (255, 255, 255),
+            1,
+        )
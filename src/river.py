@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+
+from elements import Passing
+from perception import ROI_ROWS, ROI_COLS, to_display, to_native
+
+MAX_SCROLL = 4  # Native rows the river can move down in a single frame
+CLOSE_SIZE = 7  # Closing kernel, fills small holes in the banks (houses, sprites)
+CLOSE_MARGIN = CLOSE_SIZE - 1  # Rows a closed row depends on, above and below
+# Blocked pixels two frames may differ by and still be a scroll (one pixel per row, mask is 255)
+SCROLL_TOLERANCE = 255 * (ROI_ROWS - MAX_SCROLL)
+
+# Row j of the last frame's counts lines up with this frame when it scrolled MAX_SCROLL - j
+SCROLL_WINDOWS = np.arange(MAX_SCROLL + 1)[:, None] + np.arange(ROI_ROWS - MAX_SCROLL)
+
+
+class RiverMap:
+    # Occupancy grid of the ROI in native pixels, nonzero where the bank or a road blocks the
+    # river. Rows live in a ring buffer that scrolls with the game, so every frame only the
+    # rows revealed at the top are closed again.
+    def __init__(self):
+        self.grid = np.zeros((ROI_ROWS, ROI_COLS), np.uint8)
+        self.top = 0  # Ring row holding the top row of the ROI
+        self.scroll = 0
+        self.row_counts = None
+        self.kernel = np.ones((CLOSE_SIZE, CLOSE_SIZE), np.uint8)
+        self.free = np.zeros(ROI_COLS + 2, bool)  # Padded row, free borders never match
+
+        # Work buffers, every frame reuses them. Row counts alternate between two rows, the
+        # last frame's are compared with the new ones.
+        self.integral = np.zeros((ROI_ROWS + 1, ROI_COLS + 1), np.int32)
+        self.counts = np.zeros((2, ROI_ROWS), np.int32)
+        self.closed = np.zeros((ROI_ROWS, ROI_COLS), np.uint8)
+        self.windows = np.zeros(SCROLL_WINDOWS.shape, np.int32)
+        self.frame = 0
+
+    def update(self, outside, frames=1):
+        # Row sums from the integral image, much cheaper than cv2.reduce here
+        cv2.integral(outside, self.integral)
+        row_counts = self.counts[self.frame % 2]
+        np.subtract(self.integral[1:, -1], self.integral[:-1, -1], out=row_counts)
+        self.frame += 1
+        # Scrolls are only matched between consecutive frames, skipped frames rebuild the map
+        scroll = self.estimate_scroll(row_counts) if frames == 1 else None
+        self.row_counts = row_counts
+
+        if scroll is None:
+            # First frame, respawn or any jump: rebuild the whole map
+            cv2.morphologyEx(outside, cv2.MORPH_CLOSE, self.kernel, self.grid)
+            self.top = 0
+            self.scroll = 0
+            return
+
+        # Rows close to the old top were closed without their neighbors above, redo them too
+        self.top = (self.top - scroll) % ROI_ROWS
+        rows = min(scroll + CLOSE_MARGIN, ROI_ROWS)
+        band = min(rows + CLOSE_MARGIN, ROI_ROWS)
+        closed = cv2.morphologyEx(
+            outside[:band], cv2.MORPH_CLOSE, self.kernel, self.closed[:band]
+        )
+        self.grid[self.ring_rows(0, rows)] = closed[:rows]
+        self.scroll = scroll
+
+    def estimate_scroll(self, row_counts):
+        # The playfield is mirrored, so the blocked pixel count describes a whole row
+        if self.row_counts is None:
+            return None
+        windows = self.row_counts.take(SCROLL_WINDOWS, out=self.windows)
+        np.subtract(row_counts[MAX_SCROLL:], windows, out=windows)
+        errors = np.abs(windows, out=windows).sum(axis=1)[::-1].tolist()
+
+        # Straight stretches match several scrolls, keep the last speed then
+        scroll = min(range(MAX_SCROLL + 1), key=lambda s: (errors[s], s != self.scroll))
+        return scroll if errors[scroll] <= SCROLL_TOLERANCE else None
+
+    def ring_rows(self, start, stop):
+        return (self.top + np.arange(start, stop)) % ROI_ROWS
+
+    def row(self, y):
+        # Blocked pixels of the display row y
+        return self.grid[(self.top + to_native(y)) % ROI_ROWS]
+
+    def passings(self, y):
+        # Free runs of the display row y, found from the edges of the row
+        free = self.free
+        np.equal(self.row(y), 0, out=free[1:-1])
+        edges = np.flatnonzero(free[1:] != free[:-1]).tolist()
+        return [
+            Passing(to_display(start), to_display(end) - 1)
+            for start, end in zip(edges[::2], edges[1::2])
+        ]
@@ -0,0 +1,242 @@
+import os
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+from dataclasses import asdict, replace
+
+import numpy as np
+
+from bot import Bot
+from config import DEFAULT_CONFIG, config_hash, save_config
+from controls import Controls
+from evaluate import run_episode
+from library import state_hash
+from workers import init_emulator, worker
+
+# Values tried for every tuned field of BotConfig, the defaults among them
+SEARCH_SPACE = {
+    "fuel_margin": [20, 35, 50, 70],
+    "aim_tolerance": [2, 5, 8],
+    "bridge_margin": [30, 50, 70],
+    "almost_aim_distance": [50, 75, 100],
+    "crash_distance": [50, 75, 100, 125],
+    "crash_margin": [15, 25, 40],
+    "moving_crash_margin": [50, 75, 100],
+    "plane_crash_distance": [50, 70, 90],
+    "center_margin_fuel": [30, 50, 70],
+    "center_margin": [10, 15, 25],
+    "dodge_width_ratio": [1, 2, 3],
+    "probe_offset": [12, 18, 24],
+    "probe_height": [20, 30, 40],
+    "bridge_area": [(48, 112), (40, 120), (56, 104)],
+}
+CHECKPOINTS = [1000, 2000, 3000]  # Frames of the default bot's game the start states are taken at
+ELITE = 4  # Best configs of a generation the next one is bred from
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="River Raid Bot threshold search")
+    parser.add_argument(
+        "--rom", type=str, default="river-raid.a26",
+        help="Path to the game ROM file (default: river-raid.a26)"
+    )
+    parser.add_argument(
+        "--strategy", choices=["random", "grid", "evolution"], default="random",
+        help="How candidate configs are picked (default: random)"
+    )
+    parser.add_argument(
+        "--candidates", type=int, default=16,
+        help="Configs evaluated, per generation with the evolution strategy, most for the grid"
+    )
+    parser.add_argument(
+        "--generations", type=int, default=4,
+        help="Generations of the evolution strategy"
+    )
+    parser.add_argument(
+        "--fields", type=str, nargs="+", choices=list(SEARCH_SPACE), default=list(SEARCH_SPACE),
+        help="Config fields to tune, the others keep their defaults (default: all)"
+    )
+    parser.add_argument(
+        "--max-frames", type=int, default=3000,
+        help="Frame limit per episode"
+    )
+    parser.add_argument(
+        "--perception", choices=["vision", "ram"], default="vision",
+        help="Read entities from the screen (vision) or from the game RAM (default: vision)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=multiprocessing.cpu_count(),
+        help="Number of worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Seed of the candidate sampling"
+    )
+    parser.add_argument(
+        "--cache", type=str, default="search_cache.jsonl",
+        help="Episode results by config and start state, reruns only play the missing ones"
+    )
+    parser.add_argument(
+        "--output", type=str, default="best_config.json",
+        help="Where the best config is written, load it with main.py --config"
+    )
+    args = parser.parse_args()
+    if args.strategy == "grid":
+        size = grid_size(args.fields)
+        if size > args.candidates:
+            parser.error(
+                f"the grid over {len(args.fields)} fields holds {size} configs, more than "
+                f"--candidates {args.candidates}: narrow --fields or raise --candidates"
+            )
+    return args
+
+
+def init_worker(rom, perception):
+    init_emulator(rom)
+    worker["ram_perception"] = perception == "ram"
+
+
+def record_start_states(checkpoints):
+    # The default bot plays from power-on, the frame scheduler makes its game reproducible
+    game = worker["game"]
+    game.set_state(worker["start_state"])
+    controls = Controls()
+    bot = Bot(controls, game_ram=worker["ram"])
+    states = []
+    for frame in range(max(checkpoints) + 1):
+        if frame in checkpoints:
+            states.append(game.get_state())
+        bot.refresh(game.get_screen())
+        controls.update_inputs()
+        game.set_button_mask(controls.buttons)
+        game.step()
+        controls.tick()
+    return states
+
+
+def worker_episode(task):
+    key, config, state, max_frames = task
+    auto_start = state is not None  # Games from power-on are started by the bot
+    result = run_episode(
+        worker["game"],
+        worker["ram"],
+        state if auto_start else worker["start_state"],
+        auto_start,
+        max_frames,
+        worker["ram_perception"],
+        config=config,
+    )
+    return key, result
+
+
+def load_cache(path):
+    cache = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                cache[entry["key"]] = entry["result"]
+    return cache
+
+
+def random_config(rng, fields):
+    return replace(DEFAULT_CONFIG, **{field: rng.choice(SEARCH_SPACE[field]) for field in fields})
+
+
+def grid_size(fields):
+    return math.prod(len(SEARCH_SPACE[field]) for field in fields)
+
+
+def grid_configs(fields):
+    # Every combination of the fields' values, the other fields keep their defaults
+    values = itertools.product(*(SEARCH_SPACE[field] for field in fields))
+    return [replace(DEFAULT_CONFIG, **dict(zip(fields, combo))) for combo in values]
+
+
+def breed(rng, parents, fields):
+    # Uniform crossover of two parents, then one field mutated
+    first, second = rng.sample(parents, 2) if len(parents) > 1 else parents * 2
+    child = {field: getattr(rng.choice([first, second]), field) for field in fields}
+    mutated = rng.choice(fields)
+    child[mutated] = rng.choice(SEARCH_SPACE[mutated])
+    return replace(DEFAULT_CONFIG, **child)
+
+
+def evaluate_configs(pool, configs, states, args, cache):
+    # Mean score of every config over the start states, playing only the uncached episodes
+    keys = {}
+    tasks = []
+    queued = set()
+    for config in configs:
+        for state in states:
+            start = "power-on" if state is None else state_hash(state)
+            key = f"{config_hash(config)}:{start}:{args.max_frames}:{args.perception}"
+            keys.setdefault(config, []).append(key)
+            if key not in cache and key not in queued:
+                tasks.append((key, config, state, args.max_frames))
+                queued.add(key)
+
+    print(f"Playing {len(tasks)} episodes, {sum(map(len, keys.values())) - len(tasks)} cached")
+    with open(args.cache, "a") as f:
+        for key, result in pool.imap_unordered(worker_episode, tasks):
+            cache[key] = result
+            f.write(json.dumps({"key": key, "result": result}) + "\n")
+            f.flush()
+
+    return {config: float(np.mean([cache[key]["score"] for key in keys[config]])) for config in configs}
+
+
+def changes(config):
+    # Fields that differ from the defaults, to print a config on one line
+    default = asdict(DEFAULT_CONFIG)
+    return ", ".join(f"{k}={v}" for k, v in asdict(config).items() if v != default[k]) or "defaults"
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    cache = load_cache(args.cache)
+
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(
+        args.workers, initializer=init_worker, initargs=(args.rom, args.perception)
+    ) as pool:
+        states = [None] + pool.apply(record_start_states, (CHECKPOINTS,))
+
+        scores = {}
+        if args.strategy == "grid":
+            configs = grid_configs(args.fields)
+            scores.update(evaluate_configs(pool, configs, states, args, cache))
+        elif args.strategy == "random":
+            configs = [DEFAULT_CONFIG] + [
+                random_config(rng, args.fields) for _ in range(args.candidates - 1)
+            ]
+            scores.update(evaluate_configs(pool, configs, states, args, cache))
+        else:
+            configs = [DEFAULT_CONFIG] + [
+                random_config(rng, args.fields) for _ in range(args.candidates - 1)
+            ]
+            for generation in range(args.generations):
+                scores.update(evaluate_configs(pool, configs, states, args, cache))
+                elite = sorted(scores, key=scores.get, reverse=True)[:ELITE]
+                print(f"Generation {generation + 1}/{args.generations}: best {scores[elite[0]]:.1f}")
+                configs = elite + [
+                    breed(rng, elite, args.fields) for _ in range(args.candidates - len(elite))
+                ]
+
+    ranking = sorted(scores, key=scores.get, reverse=True)
+    print(f"Evaluated {len(scores)} configs on {len(states)} start states "
+          f"({time.perf_counter() - start_time:.1f}s)")
+    for config in ranking[:10]:
+        print(f"  {scores[config]:8.1f}  {config_hash(config)[:8]}  {changes(config)}")
+
+    save_config(ranking[0], args.output)
+    print(f"Best config written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
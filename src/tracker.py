@@ -0,0 +1,86 @@
+import itertools
+import numpy as np
+
+# Distances are in display coordinates (see perception.py), times in frames
+GATE = 24  # Farthest a detection can be from a track's predicted position (L1)
+MAX_COAST = 5  # Frames a track survives without detections
+VELOCITY_SMOOTHING = 0.5  # Weight of the newest displacement in the velocity estimate
+MOVING_SPEED = 0.5  # Horizontal speed above which an enemy counts as moving
+
+
+class Tracker:
+    def __init__(self):
+        self.tracks = []
+        self.ids = itertools.count()
+
+    def predict(self, track, frames):
+        # Where the track should be now, after the frames it was missed plus the elapsed ones
+        steps = track.missed + frames
+        return [p + v * steps for p, v in zip(track.position, track.velocity)]
+
+    def associate(self, detections, frames):
+        # Gated cost matrix, assigned greedily from the cheapest pair
+        if not self.tracks or not detections:
+            return []
+
+        predicted = np.array([self.predict(track, frames) for track in self.tracks])
+        measured = np.array([detection.position for detection in detections])
+        cost = np.abs(predicted[:, None] - measured[None]).sum(axis=2)
+
+        names = np.array([track.name for track in self.tracks])
+        cost[names[:, None] != np.array([d.name for d in detections])[None]] = np.inf
+        cost[cost > GATE * frames] = np.inf
+
+        pairs = []
+        used_tracks = set()
+        used_detections = set()
+        for index in np.argsort(cost, axis=None).tolist():
+            t, d = divmod(index, len(detections))
+            if cost[t, d] == np.inf:
+                break
+            if t in used_tracks or d in used_detections:
+                continue
+            pairs.append((t, d))
+            used_tracks.add(t)
+            used_detections.add(d)
+        return pairs
+
+    def update(self, detections, frames=1):
+        # Match detections to tracks, frames after the last update, return the tracks seen now
+        pairs = self.associate(detections, frames)
+        matched = {t: d for t, d in pairs}
+
+        tracks = []
+        seen = []
+        for t, track in enumerate(self.tracks):
+            if t in matched:
+                self.correct(track, detections[matched[t]], frames)
+                seen.append(track)
+            else:
+                # Coast through missed frames, keep the last position and velocity
+                track.missed += frames
+                track.present = False
+            if track.missed <= MAX_COAST:
+                tracks.append(track)
+
+        # Unmatched detections start new tracks
+        detected = set(matched.values())
+        for d, detection in enumerate(detections):
+            if d not in detected:
+                detection.id = next(self.ids)
+                tracks.append(detection)
+                seen.append(detection)
+
+        self.tracks = tracks
+        return seen
+
+    def correct(self, track, detection, frames):
+        steps = track.missed + frames
+        track.velocity = [
+            VELOCITY_SMOOTHING * (new - old) / steps + (1 - VELOCITY_SMOOTHING) * v
+            for new, old, v in zip(detection.position, track.position, track.velocity)
+        ]
+        track.position = detection.position
+        track.missed = 0
+        track.present = True
+        track.is_moving = abs(track.velocity[0]) > MOVING_SPEED
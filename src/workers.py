@@ -0,0 +1,44 @@
+import retro
+
+from library import SECTIONS, StateLibrary, load_state
+from ram import GameRAM
+
+# Each worker process owns a single emulator (stable-retro allows one per process), the
+# initializer of its pool fills this with whatever the tasks need
+worker = {}
+
+
+def add_start_arguments(parser):
+    # Where every episode starts: power-on, a saved state or the states of a library
+    parser.add_argument(
+        "--rom", type=str, default="river-raid.a26",
+        help="Path to the game ROM file (default: river-raid.a26)"
+    )
+    parser.add_argument(
+        "--state", type=str,
+        help="Path to the saved state file to start every episode from (default: power-on)"
+    )
+    parser.add_argument(
+        "--library", type=str,
+        help="Start every episode from a state of this library instead (see library.py)"
+    )
+    parser.add_argument(
+        "--section", choices=SECTIONS,
+        help="Only start from library states in this section of the river (default: any)"
+    )
+    parser.add_argument(
+        "--min-difficulty", type=int, default=0,
+        help="Only start from library states at least this difficult"
+    )
+
+
+def init_emulator(rom, state=None, library=None, section=None, min_difficulty=0):
+    game = retro.RetroEmulator(rom)
+    worker["auto_start"] = load_state(game, state)
+    worker["start_state"] = game.get_state()
+    # Every worker holds the whole library in memory, an episode start only restores a state
+    worker["library"] = StateLibrary(library) if library is not None else None
+    worker["section"] = section
+    worker["min_difficulty"] = min_difficulty
+    worker["game"] = game
+    worker["ram"] = GameRAM(game)